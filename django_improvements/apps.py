@@ -1,5 +1,11 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 
 
 class DjangoImprovementsConfig(AppConfig):
     name = 'django_improvements'
+
+    def ready(self):
+        from django_improvements.models import ReadOnlyOnExistForeignKey
+        for model in apps.get_models():
+            if issubclass(model, ReadOnlyOnExistForeignKey):
+                model.get_readonly_relations()
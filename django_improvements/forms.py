@@ -0,0 +1,25 @@
+from django.forms.models import BaseInlineFormSet
+
+from django_improvements.models import readonly_errors
+
+
+class ReadOnlyOnExistInlineFormSet(BaseInlineFormSet):
+    """
+    Check readonly fields of ReadOnlyOnExistForeignKey instances of all
+    forms with one query per model instead of one query per form.
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super(ReadOnlyOnExistInlineFormSet, self)._construct_form(i, **kwargs)
+        form.instance._defer_readonly_check = True
+        return form
+
+    def clean(self):
+        super(ReadOnlyOnExistInlineFormSet, self).clean()
+        forms_list = [
+            i for i in self.forms
+            if i.is_valid() and not self._should_delete_form(i)
+        ]
+        errors = readonly_errors([i.instance for i in forms_list])
+        for k, error in errors.items():
+            forms_list[k].add_error(None, error)
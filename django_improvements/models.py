@@ -1,6 +1,8 @@
+from collections import defaultdict
+
 from django.utils.translation import ugettext_lazy as _
 from django.db import models
-from django.db.models import Exists
+from django.db.models import Exists, OuterRef
 from django.apps import apps
 from django.core.exceptions import ValidationError
 
@@ -13,71 +15,133 @@ class PositiveTinyIntegerField(models.PositiveSmallIntegerField):
             return 'smallint UNSIGNED'
 
 class ReadOnlyOnExistForeignKey(object):
-    def __init__(self, *args, **kwargs):
-        super(ReadOnlyOnExistForeignKey, self).__init__(*args, **kwargs)
-        self.__readonly_fields = []
-        rof = []
-        try: rof = getattr(self, 'readonly_fields')
-        except AttributeError: pass
-        for i in rof:
+    """
+    Forbid changing ``readonly_fields`` of a saved object while related
+    objects exist. ``readonly_fields`` is a list of
+    ``((related model names), (field names))`` pairs. Relations are
+    resolved once per class and original values are the ones loaded from
+    the database, so loading rows costs nothing extra; deferred fields
+    assigned before they were loaded are read with one more query.
+    """
+
+    @classmethod
+    def get_readonly_relations(cls):
+        """Return ``([(model, field name)], [field names])`` pairs."""
+        if '_readonly_relations' in cls.__dict__:
+            return cls._readonly_relations
+        result = []
+        for i in getattr(cls, 'readonly_fields', ()):
             a = []
             for j in i[0]:
                 x = True
                 y = []
-                for k in self._meta._relation_tree:
+                for k in cls._meta._relation_tree:
                     y.append(k.model.__name__)
                     if k.model.__name__ == j:
                         a.append((k.model, k.name))
                         x = False
                 if x:
                     error = "{} and {} are not related. Choices are {}."
-                    name = self.__class__.__name__
+                    name = cls.__name__
                     choices = ', '.join(y)
                     raise Exception(error.format(name, j, choices))
-            b = []
-            for j in i[1]:
-                b.append(j)
-                try:
-                    setattr(self, '__original_%s' % j, getattr(self, j))
-                except:
-                    setattr(self, '__original_%s' % j, None)
-            self.__readonly_fields.append((a, b))
+            result.append((a, list(i[1])))
+        cls._readonly_relations = result
+        return result
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(ReadOnlyOnExistForeignKey, cls).from_db(
+            db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super(ReadOnlyOnExistForeignKey, self).refresh_from_db(using, fields)
+        if '_loaded_values' in self.__dict__:
+            # Loading a deferred field also loads its original value.
+            for field in self._meta.concrete_fields:
+                name = field.attname
+                if name in self.__dict__ and (
+                        fields is None or field.name in fields or name in fields):
+                    self._loaded_values[name] = self.__dict__[name]
+
+    def get_original_value(self, field):
+        """Return value of ``field`` loaded from the database."""
+        loaded = self._loaded_values
+        if field not in loaded:
+            # A deferred field assigned before it was loaded, read all
+            # deferred fields at once and load the unassigned ones.
+            deferred = [
+                i.attname for i in self._meta.concrete_fields
+                if i.attname not in loaded
+            ]
+            row = type(self)._base_manager.using(self._state.db).filter(
+                pk=self.pk).values(*deferred).first() or {}
+            loaded.update(row)
+            for k, v in row.items():
+                self.__dict__.setdefault(k, v)
+        return loaded.get(field)
 
     def has_changed(self):
         arr = []
-        for k, v in enumerate(self.__readonly_fields):
+        if '_loaded_values' not in self.__dict__:
+            return arr
+        for k, v in enumerate(self.get_readonly_relations()):
             for field in v[1]:
-                orig = '__original_%s' % field
                 new_value = None
                 try: new_value = getattr(self, field)
                 except: pass
-                if getattr(self, orig) != new_value:
+                if self.get_original_value(field) != new_value:
                     arr.append(k)
                     break
         return arr
 
     def clean(self, *args, **kwargs):
-        hs = self.has_changed()
-        fields = [self.__readonly_fields[i] for i in hs]
-        if fields:
-            adict = {}
-            edict = {}
-            for ki, vi in enumerate(fields):
-                for kj, vj in enumerate(vi[0]):
-                    f = vj[0].objects.filter(**{vj[1]: self.id})
-                    name = 'exists%s%s' % (ki, kj)
-                    adict[name] = Exists(f)
-                    edict[name] = (vj[0], vi[1])
-            selffilter = type(self).objects.filter(pk=self.id)
-            response = selffilter.annotate(**adict).values(*adict)
-            if len(response):
-                response = response[0]
-            else: response = {}
-            for k, v in response.items():
-                error = _("{} fields can't be changed when related {} exists.")
-                pair = edict[k]
-                m = str(pair[0]._meta.verbose_name)
-                flds = [str(self._meta.get_field(i).verbose_name) for i in pair[1]]
-                f = ', '.join(flds)
-                raise ValidationError(error.format(f, m))
+        # Formsets check all their instances at once, see
+        # django_improvements.forms.ReadOnlyOnExistInlineFormSet.
+        if not getattr(self, '_defer_readonly_check', False):
+            errors = readonly_errors([self])
+            if errors:
+                raise errors[0]
         super(ReadOnlyOnExistForeignKey, self).clean(*args, **kwargs)
+
+
+def readonly_errors(instances):
+    """
+    Return ``{index: ValidationError}`` of instances of
+    ReadOnlyOnExistForeignKey models changing readonly fields while related
+    objects exist, with one query per model.
+    """
+    changed = defaultdict(list)
+    for k, v in enumerate(instances):
+        if v.pk is not None:
+            hs = v.has_changed()
+            if hs:
+                changed[type(v)].append((k, v, hs))
+    errors = {}
+    for model, items in changed.items():
+        relations = model.get_readonly_relations()
+        adict = {}
+        edict = {}
+        for ki in sorted({i for k, v, hs in items for i in hs}):
+            for kj, vj in enumerate(relations[ki][0]):
+                f = vj[0].objects.filter(**{vj[1]: OuterRef('pk')})
+                name = 'exists%s%s' % (ki, kj)
+                adict[name] = Exists(f)
+                edict[name] = (ki, vj[0], relations[ki][1])
+        response = model.objects.filter(
+            pk__in=[v.pk for k, v, hs in items],
+        ).annotate(**adict).values('pk', *adict)
+        response = {i['pk']: i for i in response}
+        for k, v, hs in items:
+            row = response.get(v.pk, {})
+            for name, pair in edict.items():
+                if pair[0] in hs and row.get(name):
+                    error = _("{} fields can't be changed when related {} exists.")
+                    m = str(pair[1]._meta.verbose_name)
+                    flds = [str(model._meta.get_field(i).verbose_name) for i in pair[2]]
+                    f = ', '.join(flds)
+                    errors[k] = ValidationError(error.format(f, m))
+                    break
+    return errors
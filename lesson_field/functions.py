@@ -0,0 +1,80 @@
+from django.db.models import ExpressionWrapper, F, Func, IntegerField
+
+WEEK_DIVISOR = 256
+DAY_DIVISOR = 32
+
+
+class IntDiv(Func):
+    """
+    Integer division of a non-negative expression by a constant, optionally
+    multiplied by another one. Constants are inlined, so expression indexes
+    match the compiled SQL.
+    """
+    arity = 1
+    template = '((%(expressions)s / %(divisor)d) * %(multiplier)d)'
+
+    def __init__(self, expression, divisor, multiplier=1, **extra):
+        super(IntDiv, self).__init__(
+            expression, divisor=divisor, multiplier=multiplier,
+            output_field=IntegerField(), **extra)
+        if multiplier == 1:
+            self.template = '(%(expressions)s / %(divisor)d)'
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        template = self.template.replace('/', 'DIV')
+        return self.as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_oracle(self, compiler, connection, **extra_context):
+        template = self.template.replace(
+            '(%(expressions)s / %(divisor)d)',
+            'TRUNC(%(expressions)s / %(divisor)d)')
+        return self.as_sql(compiler, connection, template=template, **extra_context)
+
+
+def _field(expression):
+    return F(expression) if isinstance(expression, str) else expression
+
+
+def SlotValue(expression):
+    """
+    Packed lesson slot as a plain integer, so ``values_list`` rows skip
+    LessonField.from_db_value and can go to helpers.decode as they are.
+    """
+    return ExpressionWrapper(_field(expression), output_field=IntegerField())
+
+
+def SlotWeek(expression):
+    """Week of a packed lesson slot, computed by the database."""
+    return IntDiv(_field(expression), WEEK_DIVISOR)
+
+
+def SlotDay(expression):
+    """Day of a packed lesson slot, computed by the database."""
+    expression = _field(expression)
+    return ExpressionWrapper(
+        IntDiv(expression, DAY_DIVISOR)
+        - IntDiv(expression, WEEK_DIVISOR, WEEK_DIVISOR // DAY_DIVISOR),
+        output_field=IntegerField(),
+    )
+
+
+def SlotLesson(expression):
+    """Lesson of a day of a packed lesson slot, computed by the database."""
+    expression = _field(expression)
+    return ExpressionWrapper(
+        expression - IntDiv(expression, DAY_DIVISOR, DAY_DIVISOR),
+        output_field=IntegerField(),
+    )
+
+
+def slot_annotations(field, prefix=None):
+    """
+    Return annotations of week, day and lesson of a LessonField, named
+    ``<prefix>_week`` and so on, ``prefix`` defaulting to the field name.
+    """
+    prefix = field if prefix is None else prefix
+    return {
+        prefix + '_week': SlotWeek(field),
+        prefix + '_day': SlotDay(field),
+        prefix + '_lesson': SlotLesson(field),
+    }
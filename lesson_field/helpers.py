@@ -1,34 +1,122 @@
-from django.utils.deconstruct import deconstructible
 from django.utils.translation import ugettext_lazy as _
 from django.utils.text import format_lazy
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from lesson_field import settings
 
+# Number of bits of one week in a slot bitmap.
+WEEK_SLOTS = len(settings.DAY_NAMES) * settings.MAX_LESSONS_DAY
+
+
+def slot_mask(week, day, lesson):
+    """
+    Return bitmap of a lesson slot with one bit per (week, day, lesson),
+    where numerator and denominator weeks are separate bits.
+    """
+    bit = 1 << (day * settings.MAX_LESSONS_DAY + lesson - 1)
+    mask = 0
+    if week & 0b01:
+        mask |= bit
+    if week & 0b10:
+        mask |= bit << WEEK_SLOTS
+    return mask
+
+
+def _packed(value):
+    if isinstance(value, (tuple, list)):
+        value = value[0]
+    if isinstance(value, Lesson):
+        return value.value
+    return value
+
+
+def decode(values):
+    """
+    Decode packed slots, a NumPy array or a sequence of integers, Lesson
+    objects or one element rows of them, into parallel weeks, days and
+    lessons. Arrays are returned for arrays, lists otherwise. A
+    ``values_list`` of functions.SlotValue gives integers, skipping the
+    Lesson built for every row of a plain LessonField.
+    """
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return values >> 8, (values >> 5) & 7, values & 31
+    packed = [_packed(i) for i in values]
+    return (
+        [i >> 8 for i in packed],
+        [(i >> 5) & 7 for i in packed],
+        [i & 31 for i in packed],
+    )
+
+
+def encode(weeks, days, lessons):
+    """Pack parallel weeks, days and lessons, the inverse of decode."""
+    if numpy is not None and isinstance(weeks, numpy.ndarray):
+        return (weeks << 8) | (numpy.asarray(days) << 5) | numpy.asarray(lessons)
+    return [(w << 8) | (d << 5) | l for w, d, l in zip(weeks, days, lessons)]
+
 
-@deconstructible
 class Lesson:
+    """
+    Immutable lesson slot. Instances are interned by packed value, so rows
+    with the same slot share one object.
+    """
+    __slots__ = ('week', 'day', 'lesson', 'value', 'mask')
     settings = settings
+    _instances = {}
 
-    def __init__(self, value, *args, **kwargs):
-        super(Lesson, self).__init__(*args, **kwargs)
-        if isinstance(value, tuple):
-            self.week = value[0]
-            self.day = value[1]
-            self.lesson = value[2]
+    def __new__(cls, value):
+        if isinstance(value, (tuple, list)):
+            week, day, lesson = (int(i) for i in value)
+            value = week * 256 + day * 32 + lesson
         else:
-            self.week = int(value / 256)
-            self.day = int(value % 256 / 32)
-            self.lesson = int(value % 32)
+            value = int(value)
+        try:
+            return cls._instances[value]
+        except KeyError:
+            pass
+        self = super(Lesson, cls).__new__(cls)
+        object.__setattr__(self, 'week', value // 256)
+        object.__setattr__(self, 'day', value % 256 // 32)
+        object.__setattr__(self, 'lesson', value % 32)
+        object.__setattr__(self, 'value', value)
+        mask = slot_mask(self.week, self.day, self.lesson) if self.lesson else 0
+        object.__setattr__(self, 'mask', mask)
+        return cls._instances.setdefault(value, self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Lesson is immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("Lesson is immutable.")
+
+    def __reduce__(self):
+        return (Lesson, (self.value,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def deconstruct(self):
+        return ('lesson_field.helpers.Lesson', (self.value,), {})
 
-    @property
-    def value(self):
-        return self.week * 256 + self.day * 32 + self.lesson
+    def overlapping(self):
+        """Return packed values of slots sharing a week with this one."""
+        return [
+            week * 256 + self.day * 32 + self.lesson
+            for week in range(1, 4) if week & self.week
+        ]
 
     def __getitem__(self, i):
-        return [self.week, self.day, self.lesson][i]
+        return (self.week, self.day, self.lesson)[i]
 
     def __hash__(self):
-        return hash(self.value)
+        return self.value
 
     def __proxy__(self):
         return format_lazy(
@@ -45,19 +133,27 @@ class Lesson:
             return self.value == other.value
         return self.value == other
 
-    def __gt__(self, other):
+    def __ne__(self, other):
         if isinstance(other, Lesson):
-            return self.value > other.value
-        return self.value > other
+            return self.value != other.value
+        return self.value != other
 
-    def __ne__(self, other):
-        return not self == other
+    def __lt__(self, other):
+        if isinstance(other, Lesson):
+            return self.value < other.value
+        return self.value < other
 
     def __le__(self, other):
-        return not self > other
+        if isinstance(other, Lesson):
+            return self.value <= other.value
+        return self.value <= other
 
-    def __ge__(self, other):
-        return (self > other) or self == other
+    def __gt__(self, other):
+        if isinstance(other, Lesson):
+            return self.value > other.value
+        return self.value > other
 
-    def __lt__(self, other):
-        return not self >= other
+    def __ge__(self, other):
+        if isinstance(other, Lesson):
+            return self.value >= other.value
+        return self.value >= other
@@ -0,0 +1,49 @@
+from django.db.models import IntegerField, Lookup, Transform
+
+from .functions import SlotDay, SlotLesson, SlotWeek
+from .helpers import Lesson
+
+
+class SlotTransform(Transform):
+    """Part of a packed lesson slot, computed by the database."""
+    output_field = IntegerField()
+    part = None
+
+    def as_sql(self, compiler, connection):
+        expression = self.part(self.lhs).resolve_expression(compiler.query)
+        return compiler.compile(expression)
+
+
+class WeekTransform(SlotTransform):
+    lookup_name = 'week'
+    part = staticmethod(SlotWeek)
+
+
+class DayTransform(SlotTransform):
+    lookup_name = 'day'
+    part = staticmethod(SlotDay)
+
+
+class LessonTransform(SlotTransform):
+    lookup_name = 'lesson'
+    part = staticmethod(SlotLesson)
+
+
+class WeekOverlaps(Lookup):
+    """
+    Slots sharing a week with the given week, or with the week of the given
+    Lesson, so both weeks overlap with numerator and denominator.
+    """
+    lookup_name = 'week_overlaps'
+    prepare_rhs = False
+
+    def get_prep_lookup(self):
+        if isinstance(self.rhs, Lesson):
+            return self.rhs.week
+        return self.rhs
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = compiler.compile(WeekTransform(self.lhs))
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        sql = connection.ops.combine_expression('&', [lhs, rhs])
+        return '(%s) <> 0' % sql, lhs_params + rhs_params
@@ -2,6 +2,7 @@ from django.db import models
 
 from .helpers import Lesson
 from . import forms
+from .lookups import DayTransform, LessonTransform, WeekOverlaps, WeekTransform
 from .settings import SHORT_WEEK_CHOICES, SHORT_DAY_CHOICES, LESSON_CHOICES
 
 class LessonField(models.Field):
@@ -36,3 +37,9 @@ class LessonField(models.Field):
         defaults = {'form_class': forms.LessonField}
         defaults.update(kwargs)
         return super().formfield(**defaults)
+
+
+LessonField.register_lookup(WeekTransform)
+LessonField.register_lookup(DayTransform)
+LessonField.register_lookup(LessonTransform)
+LessonField.register_lookup(WeekOverlaps)
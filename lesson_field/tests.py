@@ -0,0 +1,83 @@
+import copy
+import pickle
+
+from django.test import SimpleTestCase
+
+from lesson_field.helpers import WEEK_SLOTS, Lesson, decode, encode, slot_mask
+
+
+class LessonTest(SimpleTestCase):
+    def test_interning(self):
+        lesson = Lesson((3, 2, 4))
+        self.assertIs(Lesson(3 * 256 + 2 * 32 + 4), lesson)
+        self.assertIs(Lesson([3, 2, 4]), lesson)
+        self.assertIs(Lesson('836'), lesson)
+        self.assertEqual((lesson.week, lesson.day, lesson.lesson), (3, 2, 4))
+        self.assertEqual(tuple(lesson[i] for i in range(3)), (3, 2, 4))
+
+    def test_immutable(self):
+        lesson = Lesson((1, 0, 1))
+        with self.assertRaises(AttributeError):
+            lesson.week = 2
+        with self.assertRaises(AttributeError):
+            del lesson.day
+        self.assertEqual(lesson.week, 1)
+
+    def test_pickle_and_copy(self):
+        lesson = Lesson((2, 5, 3))
+        self.assertIs(pickle.loads(pickle.dumps(lesson)), lesson)
+        self.assertIs(copy.copy(lesson), lesson)
+        self.assertIs(copy.deepcopy({'a': lesson})['a'], lesson)
+
+    def test_deconstruct(self):
+        lesson = Lesson((2, 5, 3))
+        path, args, kwargs = lesson.deconstruct()
+        self.assertEqual(path, 'lesson_field.helpers.Lesson')
+        self.assertIs(Lesson(*args, **kwargs), lesson)
+
+    def test_compare_with_ints(self):
+        lesson = Lesson((1, 1, 1))
+        value = lesson.value
+        self.assertEqual(lesson, value)
+        self.assertNotEqual(lesson, value + 1)
+        self.assertTrue(lesson < value + 1 and lesson <= value)
+        self.assertTrue(lesson > value - 1 and lesson >= value)
+        self.assertLess(lesson, Lesson((2, 1, 1)))
+        self.assertEqual(hash(lesson), value)
+        self.assertEqual(len({lesson, Lesson(value)}), 1)
+
+    def test_mask(self):
+        self.assertEqual(Lesson((3, 1, 0)).mask, 0)
+        self.assertEqual(Lesson(0).mask, 0)
+        numerator = Lesson((1, 2, 3)).mask
+        denominator = Lesson((2, 2, 3)).mask
+        self.assertEqual(numerator, slot_mask(1, 2, 3))
+        self.assertEqual(denominator, numerator << WEEK_SLOTS)
+        self.assertEqual(Lesson((3, 2, 3)).mask, numerator | denominator)
+        self.assertFalse(numerator & denominator)
+
+    def test_overlapping(self):
+        self.assertEqual(
+            Lesson((1, 2, 3)).overlapping(),
+            [Lesson((1, 2, 3)), Lesson((3, 2, 3))],
+        )
+        self.assertEqual(
+            Lesson((3, 2, 3)).overlapping(),
+            [Lesson((1, 2, 3)), Lesson((2, 2, 3)), Lesson((3, 2, 3))],
+        )
+
+
+class DecodeTest(SimpleTestCase):
+    lessons = [Lesson((1, 0, 1)), Lesson((2, 3, 5)), Lesson((3, 5, 2))]
+    expected = ([1, 2, 3], [0, 3, 5], [1, 5, 2])
+
+    def test_values(self):
+        values = [i.value for i in self.lessons]
+        for data in (values, [(i,) for i in values], self.lessons,
+                     [(i,) for i in self.lessons]):
+            with self.subTest(data=data):
+                self.assertEqual(decode(data), self.expected)
+
+    def test_encode(self):
+        self.assertEqual(
+            encode(*self.expected), [i.value for i in self.lessons])
@@ -13,7 +13,7 @@ from django.urls import (
     # path,
     reverse,
 )
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.template.defaultfilters import escape
 from django.utils.safestring import mark_safe
 
@@ -27,8 +27,10 @@ from django_improvements.admin import (
     AdminWithSelectRelated,
     # FilterWithSelectRelated,
 )
+from django_improvements.forms import ReadOnlyOnExistInlineFormSet
 from admin_auto_filters.filters import AutocompleteFilter
 
+from timetableapp import solver
 from timetableapp.settings import (
     LIST_PER_PAGE, current_year, START_YEAR,
 )
@@ -56,6 +58,9 @@ from timetableapp.models import (
 from timetableapp.forms import (
     FormOfStudySemesterFormset,
     CurriculumForm,
+    CurriculumFormset,
+    TimeTableRecordingForm,
+    TimeTableRecordingFormset,
 )
 
 class DepartmentInline(admin.TabularInline):
@@ -165,6 +170,7 @@ class TeacherAdmin(AdminWithSelectRelated, ImportExportModelAdmin):
 
 class GroupStreamInline(admin.TabularInline):
     model = GroupStream
+    formset = ReadOnlyOnExistInlineFormSet
     show_change_link = True
 
     def get_queryset(self, request):
@@ -262,10 +268,12 @@ class YearFilter(admin.SimpleListFilter):
 class CurriculumInline(admin.TabularInline):
     model = Curriculum
     form = CurriculumForm
+    formset = CurriculumFormset
     show_change_link = True
 
 class GroupInline(admin.TabularInline):
     model = Group
+    formset = ReadOnlyOnExistInlineFormSet
     show_change_link = True
 
 @admin.register(GroupStream)
@@ -327,6 +335,7 @@ class GroupStreamYearFilter(YearFilter):
 
 class SubGroupInline(admin.TabularInline):
     model = SubGroup
+    formset = ReadOnlyOnExistInlineFormSet
     show_change_link = True
 
 
@@ -392,6 +401,7 @@ class GroupAdmin(AdminWithSelectRelated, ImportExportModelAdmin):
 
 class LessonInline(AdminStackedInlineWithSelectRelated, admin.StackedInline):
     model = Lesson
+    formset = ReadOnlyOnExistInlineFormSet
     show_change_link = True
     autocomplete_fields = ('subgroup', 'subject', 'teacher',)
 
@@ -502,6 +512,13 @@ class CurriculumRecordingAdmin(AdminWithSelectRelated, ImportExportModelAdmin):
         'semester',
     )
 
+    def get_queryset(self, request):
+        qs = super(CurriculumRecordingAdmin, self).get_queryset(request)
+        # __str__ and subjects_list both list subject names of every row.
+        return qs.prefetch_related(
+            Prefetch('subjects', queryset=Subject.objects.only('pk', 'name')),
+        )
+
     def subjects_list(self, obj=None):
         if obj:
             return obj.get_subject_name()
@@ -529,6 +546,8 @@ class TeacherFilter(AutocompleteFilter):
 
 class TimeTableRecordingInline(AdminStackedInlineWithSelectRelated, admin.StackedInline):
     model = TimeTableRecording
+    form = TimeTableRecordingForm
+    formset = TimeTableRecordingFormset
     show_change_link = True
     autocomplete_fields = ('classroom', 'teacher',)
 
@@ -564,8 +583,17 @@ class LessonAdmin(AdminWithSelectRelated, ImportExportModelAdmin):
         'subgroup__group__number',
     )
 
+    actions = ('generate_timetable',)
+
     # TODO: Smart searching in get_search_results
 
+    def generate_timetable(self, request, queryset):
+        recordings, unplaced = solver.generate_timetable(queryset)
+        self.message_user(request, _(
+            "Created {} time table recordings, {} recordings could not be placed."
+        ).format(len(recordings), unplaced))
+    generate_timetable.short_description = _('Generate time table')
+
     class Media:
         pass
 
@@ -623,6 +651,9 @@ class TimeTableRecordingAdmin(AdminWithSelectRelated, ImportExportModelAdmin):
         'lesson__subgroup__group__group_stream',
         'lesson__subgroup__group__group_stream__specialty',
         'lesson__subgroup__group__group_stream__specialty__faculty',
+        'lesson__subgroup__group__group_stream__form',
+        'lesson__subject',
+        'lesson__subject__department',
         'classroom',
         'classroom__building',
         'teacher',
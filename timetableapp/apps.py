@@ -5,3 +5,7 @@ from django.apps import AppConfig
 class TimetableappConfig(AppConfig):
     name = 'timetableapp'
     verbose_name = _('Timetable Application')
+
+    def ready(self):
+        from timetableapp.signals import connect_signals
+        connect_signals()
@@ -0,0 +1,248 @@
+import datetime
+import platform
+import statistics
+import timeit
+from collections import OrderedDict, namedtuple
+
+import django
+from django.contrib import admin
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from import_export.admin import ImportExportModelAdmin
+
+from lesson_field.functions import SlotValue
+from lesson_field.helpers import Lesson as LessonNumber, decode, encode
+from yearlessdate.helpers import YearlessDate, YearlessDateRange
+
+from timetableapp.cache import get_cache
+from timetableapp.fake import SIZES, generate_university
+from timetableapp.models import (
+    FormOfStudy, GroupStream, Lesson, Specialty, TimeTableRecording,
+)
+from timetableapp.views import build_timetable, current_datetime
+
+# Version of the results file format.
+FORMAT = 1
+# Rows exported and imported by import-export benchmarks.
+EXPORT_ROWS = 1000
+IMPORT_ROWS = 100
+# Lessons of get_conflicting and instantiation benchmarks.
+LESSON_ROWS = 1000
+CONFLICT_ROWS = 100
+
+# ``ratio`` is new time over base time of the best repeats.
+Comparison = namedtuple('Comparison', ['size', 'name', 'base', 'new', 'ratio'])
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    Register a benchmark. The function prepares data outside the timing and
+    returns a callable to time, or None when the dataset has nothing to run.
+    """
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def _busiest_stream():
+    row = TimeTableRecording.objects.filter(lesson__semester=1).values(
+        'lesson__subgroup__group__group_stream',
+    ).annotate(count=Count('pk')).order_by('-count').first()
+    return row and row['lesson__subgroup__group__group_stream']
+
+
+@benchmark('timetable.build')
+def bench_build_timetable():
+    stream = _busiest_stream()
+    if stream is None:
+        return None
+    return lambda: build_timetable(stream, 1)
+
+
+@benchmark('timetable.view')
+def bench_current_datetime():
+    stream = _busiest_stream()
+    if stream is None:
+        return None
+    request = RequestFactory().get('/')
+
+    def run():
+        get_cache().clear()
+        current_datetime(request, stream, 1)
+    return run
+
+
+@benchmark('lesson_number.decode')
+def bench_lesson_number_decode():
+    values = list(TimeTableRecording.objects.values_list(
+        SlotValue('lesson_number'), flat=True).order_by('pk'))
+    return lambda: decode(values)
+
+
+@benchmark('lesson_number.encode')
+def bench_lesson_number_encode():
+    weeks, days, lessons = decode(TimeTableRecording.objects.values_list(
+        SlotValue('lesson_number'), flat=True).order_by('pk'))
+    return lambda: encode(weeks, days, lessons)
+
+
+@benchmark('lesson_number.new')
+def bench_lesson_number_new():
+    values = [i.value for i in TimeTableRecording.objects.values_list(
+        'lesson_number', flat=True).order_by('pk')]
+    return lambda: [LessonNumber(i) for i in values]
+
+
+@benchmark('yearless_date.from_value')
+def bench_yearless_date():
+    values = [
+        YearlessDate(month, day).value
+        for month in range(1, 13) for day in range(1, 29)
+    ] * 10
+    return lambda: [YearlessDate.from_value(i) for i in values]
+
+
+@benchmark('yearless_date_range.from_value')
+def bench_yearless_date_range():
+    start = YearlessDate(9, 1)
+    values = [
+        YearlessDateRange(start, YearlessDate(month, 28)).value
+        for month in range(1, 13)
+    ] * 280
+    return lambda: [YearlessDateRange.from_value(i) for i in values]
+
+
+@benchmark('lesson.get_conflicting')
+def bench_get_conflicting():
+    lessons = list(Lesson.objects.order_by('pk')[:CONFLICT_ROWS])
+    return lambda: [list(i.get_conflicting()) for i in lessons]
+
+
+@benchmark('lesson.from_db')
+def bench_lesson_from_db():
+    queryset = Lesson.objects.order_by('pk')[:LESSON_ROWS]
+    return lambda: list(queryset.all())
+
+
+@benchmark('lesson.init')
+def bench_lesson_init():
+    rows = list(Lesson.objects.values(
+        'subgroup_id', 'semester', 'subject_id', 'lesson', 'teacher_id',
+    ).order_by('pk')[:LESSON_ROWS])
+    return lambda: [Lesson(**i) for i in rows]
+
+
+@benchmark('group_stream.save')
+def bench_group_stream_save():
+    specialty = Specialty.objects.order_by('pk').first()
+    form = FormOfStudy.objects.order_by('pk').first()
+    if specialty is None or form is None:
+        return None
+    year = (GroupStream.objects.aggregate(year=Min('year'))['year'] or 2000) - 1
+
+    def run():
+        with transaction.atomic():
+            GroupStream(specialty=specialty, year=year, form=form).save()
+            transaction.set_rollback(True)
+    return run
+
+
+def _import_export_benchmarks():
+    for model, model_admin in admin.site._registry.items():
+        if not isinstance(model_admin, ImportExportModelAdmin):
+            continue
+        name = model._meta.model_name
+        queryset = model._default_manager.order_by('pk')
+
+        def export(model_admin=model_admin, queryset=queryset):
+            resource = model_admin.get_export_resource_class()()
+            return lambda: resource.export(queryset[:EXPORT_ROWS])
+
+        def import_(model_admin=model_admin, queryset=queryset):
+            dataset = model_admin.get_export_resource_class()().export(
+                queryset[:IMPORT_ROWS])
+            resource = model_admin.get_import_resource_class()()
+            return lambda: resource.import_data(dataset, dry_run=True)
+
+        benchmark('export.%s' % name)(export)
+        benchmark('import.%s' % name)(import_)
+
+
+_import_export_benchmarks()
+
+
+def measure(func, repeat):
+    """Return seconds of one call of the best and median repeats."""
+    # Calls of one repeat are chosen to take at least 0.2 seconds.
+    number, _ = timeit.Timer(func).autorange()
+    times = [i / number for i in timeit.Timer(func).repeat(repeat, number)]
+    return OrderedDict([
+        ('best', min(times)),
+        ('median', statistics.median(times)),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def run_size(names, repeat):
+    results = OrderedDict()
+    for name in names:
+        func = BENCHMARKS[name]()
+        if func is not None:
+            results[name] = measure(func, repeat)
+    return results
+
+
+def run(sizes, names=None, repeat=5, seed=0, callback=None):
+    """
+    Generate a university of every size preset in a test database, time
+    benchmarks of ``names``, all by default, and return results ready to
+    be dumped as JSON.
+    """
+    names = list(BENCHMARKS) if names is None else names
+    results = OrderedDict()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with override_settings(DEBUG=False):
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                get_cache().clear()
+                generate_university(SIZES[size], seed=seed)
+                results[size] = run_size(names, repeat)
+                if callback is not None:
+                    callback(size, results[size])
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return OrderedDict([
+        ('format', FORMAT),
+        ('created', datetime.datetime.now().isoformat(timespec='seconds')),
+        ('python', platform.python_version()),
+        ('django', django.get_version()),
+        ('database', connection.vendor),
+        ('seed', seed),
+        ('repeat', repeat),
+        ('sizes', results),
+    ])
+
+
+def compare(base, new):
+    """Return a Comparison of every benchmark present in both results."""
+    result = []
+    for size, benchmarks in new['sizes'].items():
+        base_benchmarks = base['sizes'].get(size, {})
+        for name, timing in benchmarks.items():
+            if name not in base_benchmarks:
+                continue
+            base_time = base_benchmarks[name]['best']
+            result.append(Comparison(
+                size, name, base_time, timing['best'],
+                timing['best'] / base_time if base_time else float('inf'),
+            ))
+    return result
@@ -0,0 +1,35 @@
+from django.db.models import Max
+
+
+def bulk_create(model, objs, fields):
+    """
+    Create objects, reading primary keys back by unique ``fields`` on
+    backends which do not return them from bulk inserts.
+    """
+    model.objects.bulk_create(objs)
+    if any(i.pk is None for i in objs):
+        rows = model.objects.filter(**{
+            fields[0] + '__in': {getattr(i, fields[0]) for i in objs},
+        }).values_list('pk', *fields).order_by()
+        keys = {row[1:]: row[0] for row in rows}
+        for i in objs:
+            i.pk = keys[tuple(getattr(i, j) for j in fields)]
+    return objs
+
+
+def bulk_create_ordered(model, objs):
+    """
+    Create objects of a model without unique fields, reading new rows back
+    in insertion order, which matches primary key order inside the
+    transaction.
+    """
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objs)
+    if any(i.pk is None for i in objs):
+        pks = list(model.objects.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True))
+        if len(pks) != len(objs):
+            raise RuntimeError("Rows were created concurrently, try again.")
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+    return objs
@@ -0,0 +1,95 @@
+import time
+
+from django.core.cache import caches
+from django.utils.translation import get_language
+
+from timetableapp.settings import CACHE_ALIAS, CACHE_TIMEOUT
+
+KEY_PREFIX = 'timetableapp'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version_key(*parts):
+    return ':'.join((KEY_PREFIX, 'version') + tuple(str(i) for i in parts))
+
+
+def _new_version():
+    # Versions start from the clock instead of 1, so a version key evicted
+    # from the cache never brings back entries of an older generation.
+    return time.time_ns()
+
+
+def _get_versions(*keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            versions[key] = _new_version()
+            cache.add(key, versions[key], None)
+    return [versions[key] for key in keys]
+
+
+def _bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+# Timetables are cached per owner, either a group stream or a teacher, and
+# period, a semester of the group stream or a date of the teacher.
+STREAM = 'stream'
+TEACHER = 'teacher'
+
+
+def timetable_key(kind, owner, pk, period, stamp=None):
+    """
+    Versions kept in the cache only reach other processes through a shared
+    cache, so group stream keys also carry ``stamp``, the TimeTableStamp
+    version from the database. Keys without a stamp may stay stale for up to
+    CACHE_TIMEOUT in other processes of a per-process cache.
+    """
+    versions = _get_versions(
+        _version_key(owner, pk),
+        _version_key('timetable', owner, pk, period),
+    )
+    parts = (KEY_PREFIX, kind, owner, pk, period, stamp) + tuple(versions)
+    return ':'.join(str(i) for i in parts + (get_language(),))
+
+
+def get_timetable(kind, pk, period, owner=STREAM, stamp=None):
+    return get_cache().get(timetable_key(kind, owner, pk, period, stamp))
+
+
+def set_timetable(kind, pk, period, value, owner=STREAM, stamp=None):
+    key = timetable_key(kind, owner, pk, period, stamp)
+    get_cache().set(key, value, CACHE_TIMEOUT)
+
+
+def invalidate_timetable(pk, period=None, owner=STREAM):
+    """Drop cached timetables of an owner, or of one of its periods."""
+    if period is None:
+        _bump_version(_version_key(owner, pk))
+    else:
+        _bump_version(_version_key('timetable', owner, pk, period))
+
+
+def occupancy_key(day):
+    version = _get_versions(_version_key('occupancy'))[0]
+    return '%s:occupancy:%s:%s' % (KEY_PREFIX, day, version)
+
+
+def get_occupancy(day):
+    return get_cache().get(occupancy_key(day))
+
+
+def set_occupancy(day, value):
+    get_cache().set(occupancy_key(day), value, CACHE_TIMEOUT)
+
+
+def invalidate_occupancy():
+    _bump_version(_version_key('occupancy'))
@@ -0,0 +1,339 @@
+from collections import defaultdict, namedtuple
+
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.translation import ugettext_lazy as _
+
+from timetableapp.layout import lcm
+from timetableapp.models import (
+    Curriculum, Lesson, SubGroup, SubGroupConflict, TimeTableRecording,
+)
+
+SubGroupRow = namedtuple('SubGroupRow', [
+    'pk', 'group', 'group_stream', 'group_number', 'numerator', 'denominator',
+])
+
+# ``recording`` clashes with ``other``, which is a saved recording or another
+# recording of the same batch.
+Conflict = namedtuple('Conflict', ['recording', 'other'])
+
+# ``recording`` takes the teacher or classroom, named by ``field``, which
+# ``other`` already takes at an overlapping slot and period.
+Booking = namedtuple('Booking', ['recording', 'other', 'field'])
+
+RECORDING_STR_RELATED = (
+    'lesson__subject__department',
+    'lesson__subgroup__group__group_stream__specialty',
+    'lesson__subgroup__group__group_stream__form',
+)
+
+
+class SubGroupHierarchy:
+    """
+    Subgroups of whole group streams, loaded with one query, answering
+    SubGroup.get_conflict_subgroups in memory.
+    """
+
+    def __init__(self, rows):
+        self.subgroups = {}
+        self.group_subgroups = defaultdict(list)
+        self.stream_groups = defaultdict(dict)
+        self._conflicts = {}
+        for row in rows:
+            row = SubGroupRow(*row)
+            self.subgroups[row.pk] = row
+            self.group_subgroups[row.group].append(row)
+            self.stream_groups[row.group_stream][row.group] = row.group_number
+
+    @classmethod
+    def load(cls, subgroups):
+        """Load group streams of given subgroup primary keys."""
+        return cls.load_streams(SubGroup.objects.filter(
+            pk__in=subgroups).values('group__group_stream'))
+
+    @classmethod
+    def load_streams(cls, group_streams):
+        rows = SubGroup.objects.filter(
+            group__group_stream__in=group_streams,
+        ).values_list(
+            'pk', 'group', 'group__group_stream', 'group__number',
+            'numerator', 'denominator',
+        ).order_by()
+        return cls(rows)
+
+    @staticmethod
+    def is_union(row):
+        return row.numerator == 0 and row.denominator == 0
+
+    def conflict_subgroups(self, pk):
+        """Return primary keys of SubGroup.get_conflict_subgroups."""
+        if pk in self._conflicts:
+            return self._conflicts[pk]
+        row = self.subgroups[pk]
+        own = self.group_subgroups[row.group]
+        if self.is_union(row):
+            result = {i.pk for i in own}
+        else:
+            result = {i.pk for i in own if self.is_union(i)}
+            groups = self.stream_groups[row.group_stream]
+            for group, number in groups.items():
+                if group != row.group and (row.group_number == 0 or number == 0):
+                    result.update(i.pk for i in self.group_subgroups[group])
+        self._conflicts[pk] = frozenset(result)
+        return self._conflicts[pk]
+
+    def group_width(self, group):
+        width = 1
+        for i in self.group_subgroups[group]:
+            if i.denominator:
+                width = lcm(width, i.denominator)
+        return width
+
+    def atoms(self, pk):
+        """
+        Return students of a subgroup as (group, column) pairs, columns being
+        the ones the subgroup takes in a rendered timetable. Subgroups
+        sharing students share atoms.
+        """
+        row = self.subgroups[pk]
+        if row.group_number == 0:
+            return frozenset(
+                (group, i) for group in self.stream_groups[row.group_stream]
+                for i in range(self.group_width(group))
+            )
+        width = self.group_width(row.group)
+        if self.is_union(row):
+            columns = range(width)
+        else:
+            part = width // row.denominator
+            columns = range(part * (row.numerator - 1), part * row.numerator)
+        return frozenset((row.group, i) for i in columns)
+
+
+def lesson_key(lesson):
+    return (lesson.semester, lesson.subject_id, lesson.lesson)
+
+
+def recording_lessons(recordings):
+    # Inline formsets attach their parent lesson, which may be unsaved yet.
+    lessons = {}
+    missing = set()
+    for k, v in enumerate(recordings):
+        if TimeTableRecording.lesson.is_cached(v):
+            lessons[k] = v.lesson
+        elif v.lesson_id is not None:
+            missing.add(v.lesson_id)
+    if missing:
+        loaded = Lesson.objects.in_bulk(missing)
+        for k, v in enumerate(recordings):
+            if k not in lessons and v.lesson_id in loaded:
+                lessons[k] = loaded[v.lesson_id]
+    return lessons
+
+
+def find_recording_conflicts(recordings):
+    """
+    Check a batch of recordings the way TimeTableRecording.validate_unique
+    does, with a constant number of queries, and return every Conflict.
+    """
+    recordings = list(recordings)
+    lessons = recording_lessons(recordings)
+    if not lessons:
+        return []
+    closure = defaultdict(set)
+    for subgroup, other in SubGroupConflict.objects.filter(
+            subgroup__in={i.subgroup_id for i in lessons.values()},
+    ).values_list('subgroup', 'other').order_by():
+        closure[subgroup].add(other)
+    conflicts = {
+        k: closure[v.subgroup_id]
+        for k, v in lessons.items() if v.subgroup_id in closure
+    }
+    if not conflicts:
+        return []
+
+    def conflicting(k, other):
+        lesson = lessons[k]
+        return (
+            other.pk != lesson.pk and other.subgroup_id in conflicts[k]
+            and lesson_key(other) == lesson_key(lesson)
+        )
+
+    subgroups = set().union(*conflicts.values())
+    keys = [lesson_key(lessons[k]) for k in conflicts]
+    candidates = Lesson.objects.filter(
+        subgroup__in=subgroups,
+        semester__in={i[0] for i in keys},
+        subject__in={i[1] for i in keys},
+        lesson__in={i[2] for i in keys},
+    ).order_by()
+    matched = {
+        k: {i.pk for i in candidates if conflicting(k, i)}
+        for k in conflicts
+    }
+    lesson_pks = set().union(*matched.values())
+    batch = {i.pk for i in recordings if i.pk is not None}
+    saved = []
+    if lesson_pks:
+        saved = TimeTableRecording.objects.filter(
+            lesson__in=lesson_pks,
+        ).exclude(pk__in=batch).select_related(
+            'lesson__subject__department',
+            'lesson__subgroup__group__group_stream__specialty',
+            'lesson__subgroup__group__group_stream__form',
+        )
+
+    result = []
+    for other in saved:
+        for k, pks in matched.items():
+            if other.lesson_id in pks:
+                result.append(Conflict(recordings[k], other))
+    for k in conflicts:
+        for j, lesson in lessons.items():
+            if j != k and conflicting(k, lesson):
+                result.append(Conflict(recordings[k], recordings[j]))
+    return result
+
+
+def find_duplicate_slots(recordings):
+    """
+    Check ``unique_together`` of lesson and lesson number for a batch of
+    recordings with one query and return every Conflict.
+    """
+    recordings = [i for i in recordings if i.lesson_id is not None]
+    if not recordings:
+        return []
+    batch = {i.pk for i in recordings if i.pk is not None}
+    saved = TimeTableRecording.objects.filter(
+        lesson__in={i.lesson_id for i in recordings},
+        lesson_number__in={i.lesson_number for i in recordings},
+    ).exclude(pk__in=batch).select_related(*RECORDING_STR_RELATED)
+    slots = {(i.lesson_id, i.lesson_number): i for i in saved}
+    return [
+        Conflict(i, slots[i.lesson_id, i.lesson_number]) for i in recordings
+        if (i.lesson_id, i.lesson_number) in slots
+    ]
+
+
+def slots_overlap(a, b):
+    return a.day == b.day and a.lesson == b.lesson and a.week & b.week
+
+
+def periods_overlap(a, b):
+    # Unknown dates are open ended, so they overlap with everything.
+    return (
+        (a[0] is None or b[1] is None or a[0] <= b[1])
+        and (b[0] is None or a[1] is None or b[0] <= a[1])
+    )
+
+
+def recording_periods(recordings, lessons):
+    """Return (start, end) of recordings, defaulting to their curriculum."""
+    streams = dict(SubGroup.objects.filter(
+        pk__in={i.subgroup_id for i in lessons.values()},
+    ).values_list('pk', 'group__group_stream').order_by())
+    keys = {
+        k: (streams.get(v.subgroup_id), v.semester)
+        for k, v in lessons.items()
+    }
+    dates = {}
+    if keys:
+        rows = Curriculum.objects.filter(
+            group_stream__in={i[0] for i in keys.values()},
+            semester__in={i[1] for i in keys.values()},
+        ).values_list('group_stream', 'semester', 'start_date', 'end_date')
+        dates = {(i[0], i[1]): i[2:] for i in rows}
+    periods = {}
+    for k, v in enumerate(recordings):
+        start, end = dates.get(keys.get(k), (None, None))
+        periods[k] = (v.start_date or start, v.end_date or end)
+    return periods
+
+
+def with_periods(queryset):
+    """
+    Annotate recordings with ``period_start`` and ``period_end``, their own
+    dates defaulting to the curriculum of their group stream semester.
+    """
+    curriculum = Curriculum.objects.filter(
+        group_stream=OuterRef('lesson__subgroup__group__group_stream'),
+        semester=OuterRef('lesson__semester'),
+    )
+    return queryset.annotate(
+        period_start=Coalesce(
+            'start_date', Subquery(curriculum.values('start_date')[:1])),
+        period_end=Coalesce(
+            'end_date', Subquery(curriculum.values('end_date')[:1])),
+    )
+
+
+def on_date(queryset, day):
+    """
+    Return recordings of ``queryset`` whose period, from with_periods,
+    contains ``day``. Unknown dates are open ended.
+    """
+    return with_periods(queryset).filter(
+        Q(period_start__isnull=True) | Q(period_start__lte=day),
+        Q(period_end__isnull=True) | Q(period_end__gte=day),
+    )
+
+
+def find_double_bookings(recordings):
+    """
+    Return a Booking for every recording whose teacher or classroom is
+    already taken at an overlapping slot. A recording without its own
+    teacher takes the teacher of its lesson.
+    """
+    recordings = [i for i in recordings if i.lesson_number is not None]
+    lessons = recording_lessons(recordings)
+    teachers = {}
+    for k, v in enumerate(recordings):
+        lesson = lessons.get(k)
+        teachers[k] = v.teacher_id or (lesson.teacher_id if lesson else None)
+    teacher_ids = {i for i in teachers.values() if i is not None}
+    classroom_ids = {i.classroom_id for i in recordings if i.classroom_id}
+    if not teacher_ids and not classroom_ids:
+        return []
+    periods = recording_periods(recordings, lessons)
+
+    query = Q(classroom__in=classroom_ids)
+    if teacher_ids:
+        query |= Q(teacher__in=teacher_ids)
+        query |= Q(teacher__isnull=True, lesson__teacher__in=teacher_ids)
+    values = set()
+    for i in recordings:
+        values.update(i.lesson_number.overlapping())
+    batch = {i.pk for i in recordings if i.pk is not None}
+    saved = with_periods(TimeTableRecording.objects.filter(
+        query, lesson_number__in=values,
+    ).exclude(pk__in=batch)).select_related(*RECORDING_STR_RELATED)
+
+    # Only recordings of the same day and lesson can overlap.
+    others = defaultdict(list)
+    for i in saved:
+        others[i.lesson_number.day, i.lesson_number.lesson].append((
+            i, i.teacher_id or i.lesson.teacher_id,
+            (i.period_start, i.period_end),
+        ))
+    for k, v in enumerate(recordings):
+        others[v.lesson_number.day, v.lesson_number.lesson].append(
+            (v, teachers[k], periods[k]))
+    result = []
+    for k, v in enumerate(recordings):
+        number = v.lesson_number
+        for other, teacher, period in others[number.day, number.lesson]:
+            if other is v or not slots_overlap(v.lesson_number, other.lesson_number):
+                continue
+            if not periods_overlap(periods[k], period):
+                continue
+            if teachers[k] is not None and teachers[k] == teacher:
+                result.append(Booking(v, other, 'teacher'))
+            elif v.classroom_id and v.classroom_id == other.classroom_id:
+                result.append(Booking(v, other, 'classroom'))
+    return result
+
+
+def double_booking_error(booking):
+    field = TimeTableRecording._meta.get_field(booking.field)
+    error = _("The {} is already booked at this time by {}.")
+    return error.format(field.verbose_name, booking.other)
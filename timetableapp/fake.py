@@ -0,0 +1,312 @@
+import random
+from collections import namedtuple
+
+from django.db import transaction
+
+from lesson_field.helpers import Lesson as LessonNumber
+from yearlessdate.helpers import YearlessDate, YearlessDateRange
+
+from timetableapp.bulk import bulk_create_ordered
+from timetableapp.cache import (
+    STREAM, TEACHER, invalidate_occupancy, invalidate_timetable,
+)
+from timetableapp.models import (
+    Building, Classroom, Curriculum, CurriculumRecording, Department, Faculty,
+    FormOfStudy, FormOfStudySemester, Group, GroupStream, Lesson, Person,
+    Specialty, Subject, SubGroup, SubGroupConflict, Teacher,
+    TimeTableRecording, TimeTableStamp,
+)
+from timetableapp.settings import SEMESTER_WEEKS, current_year
+from timetableapp.solver import BOTH, DENOMINATOR, NUMERATOR, SLOTS
+
+# Numbers of faculties, of departments and specialties of a faculty, of
+# subjects and teachers of a department, of years of group streams, of
+# groups of a group stream, of subjects of a semester, of buildings and of
+# classrooms of a building.
+Size = namedtuple('Size', [
+    'faculties', 'departments', 'specialties', 'subjects', 'teachers',
+    'years', 'groups', 'semester_subjects', 'buildings', 'classrooms',
+])
+
+SIZES = {
+    'tiny': Size(1, 2, 1, 4, 4, 1, 2, 2, 1, 20),
+    'small': Size(3, 2, 2, 6, 6, 2, 2, 3, 2, 40),
+    'medium': Size(10, 3, 3, 8, 12, 4, 3, 4, 10, 60),
+    'large': Size(30, 4, 4, 8, 16, 4, 4, 4, 40, 50),
+}
+
+# Numbers of rows created by generate_university.
+University = namedtuple('University', [
+    'faculties', 'group_streams', 'groups', 'subgroups', 'lessons',
+    'recordings', 'unplaced',
+])
+
+# Name, suffix and number of semesters of forms of study.
+FORMS = (('full-time', '', 8), ('extramural', 'e', 10))
+SEMESTER_RANGES = (
+    YearlessDateRange(YearlessDate(9, 1), YearlessDate(12, 31)),
+    YearlessDateRange(YearlessDate(2, 1), YearlessDate(6, 30)),
+)
+# Random classrooms tried at a free slot before moving to the next one.
+ROOM_TRIES = 8
+
+FIRST_NAMES = (
+    'Andrii', 'Bohdan', 'Vira', 'Halyna', 'Dmytro', 'Olena', 'Iryna',
+    'Kateryna', 'Mykola', 'Oksana', 'Petro', 'Roman', 'Sofiia', 'Taras',
+)
+LAST_NAMES = (
+    'Bondarenko', 'Boiko', 'Hrytsenko', 'Kovalenko', 'Kravchenko',
+    'Lysenko', 'Melnyk', 'Moroz', 'Panasenko', 'Savchenko', 'Shevchenko',
+    'Tkachenko', 'Zinchenko',
+)
+FIELDS = (
+    'Mathematics', 'Physics', 'Chemistry', 'Biology', 'History', 'Economics',
+    'Law', 'Philology', 'Informatics', 'Mechanics', 'Ecology', 'Philosophy',
+)
+TOPICS = (
+    'Foundations', 'Methods', 'Theory', 'Practice', 'Modelling', 'Analysis',
+    'Systems', 'Design',
+)
+
+
+class Scheduler:
+    """
+    Greedy placement of recordings into random free slots. Resources are
+    teachers and classrooms of a term or students of a group stream
+    semester, each with a bitmap of taken LessonNumber masks.
+    """
+
+    def __init__(self, rooms, rng):
+        self.rooms = rooms
+        self.random = rng
+        self.busy = {}
+
+    def free(self, resource, mask):
+        return not self.busy.get(resource, 0) & mask
+
+    def take(self, resource, mask):
+        self.busy[resource] = self.busy.get(resource, 0) | mask
+
+    def place(self, resources, term, weeks):
+        """Return a free (LessonNumber, classroom pk) or None."""
+        start = self.random.randrange(len(SLOTS))
+        tries = min(ROOM_TRIES, len(self.rooms))
+        for i in range(len(SLOTS)):
+            day, number = SLOTS[(start + i) % len(SLOTS)]
+            for week in weeks:
+                slot = LessonNumber((week, day, number))
+                if not all(self.free(j, slot.mask) for j in resources):
+                    continue
+                for room in self.random.sample(self.rooms, tries):
+                    if self.free((room, term), slot.mask):
+                        for j in resources:
+                            self.take(j, slot.mask)
+                        self.take((room, term), slot.mask)
+                        return slot, room
+        return None
+
+
+def _unique_names(count, make):
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = make()
+        if name in seen:
+            name = '%s %s' % (name, len(names) + 1)
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _person_name(rng):
+    return (rng.choice(FIRST_NAMES), rng.choice(FIRST_NAMES) + 'ovych',
+            rng.choice(LAST_NAMES))
+
+
+def generate_university(size, seed=None, year=None):
+    """
+    Fill an empty database with a university of a Size, group streams of
+    the last ``size.years`` years up to ``year`` and lessons of every
+    semester placed without double bookings. Rows are inserted with bulk
+    queries in dependency order, keeping union groups, union subgroups,
+    curricula and subgroup conflicts the way saving models one by one
+    does. Lessons which find no free slot are left without recordings.
+    """
+    rng = random.Random(seed)
+    if year is None:
+        year = current_year()
+    with transaction.atomic():
+        forms = bulk_create_ordered(FormOfStudy, [
+            FormOfStudy(name=name, suffix=suffix, semesters=semesters, priority=k)
+            for k, (name, suffix, semesters) in enumerate(FORMS, 1)
+        ])
+        FormOfStudySemester.objects.bulk_create(
+            FormOfStudySemester(form=form, date_range=date_range)
+            for form in forms for date_range in SEMESTER_RANGES
+        )
+        buildings = bulk_create_ordered(Building, [
+            Building(number=k, address='%s Universytetska street' % k)
+            for k in range(1, size.buildings + 1)
+        ])
+        classrooms = bulk_create_ordered(Classroom, [
+            Classroom(building=building, number=100 * (k // 20 + 1) + k % 20)
+            for building in buildings for k in range(size.classrooms)
+        ])
+        scheduler = Scheduler([i.pk for i in classrooms], rng)
+
+        faculties = bulk_create_ordered(Faculty, [
+            Faculty(name='Faculty of %s %s' % (FIELDS[k % len(FIELDS)], k + 1),
+                    abbreviation='F%s' % (k + 1))
+            for k in range(size.faculties)
+        ])
+        departments = bulk_create_ordered(Department, [
+            Department(faculty=faculty, name='Department of %s %s-%s' % (
+                rng.choice(FIELDS), faculty.abbreviation, k + 1),
+                abbreviation='%sD%s' % (faculty.abbreviation, k + 1))
+            for faculty in faculties for k in range(size.departments)
+        ])
+        subject_names = _unique_names(
+            len(departments) * size.subjects,
+            lambda: '%s of %s' % (rng.choice(TOPICS), rng.choice(FIELDS)))
+        subjects = bulk_create_ordered(Subject, [
+            Subject(name=subject_names.pop(), department=department)
+            for department in departments for k in range(size.subjects)
+        ])
+        person_names = _unique_names(
+            len(departments) * size.teachers,
+            lambda: ' '.join(_person_name(rng)))
+        persons = bulk_create_ordered(Person, [
+            Person(first_name=first, middle_name=middle, last_name=last)
+            for first, middle, last in (
+                i.split(' ', 2) for i in person_names)
+        ])
+        teachers = bulk_create_ordered(Teacher, [
+            Teacher(person=person, department=departments[k // size.teachers])
+            for k, person in enumerate(persons)
+        ])
+        specialties = bulk_create_ordered(Specialty, [
+            Specialty(faculty=faculty, name='%s %s-%s' % (
+                rng.choice(FIELDS), faculty.abbreviation, k + 1),
+                number=100 + i * size.specialties + k,
+                abbreviation='%sS%s' % (faculty.abbreviation, k + 1))
+            for i, faculty in enumerate(faculties)
+            for k in range(size.specialties)
+        ])
+
+        streams = GroupStream.bulk_create(
+            GroupStream(specialty=specialty, year=stream_year, form=form)
+            for specialty in specialties for form in forms
+            for stream_year in range(year - size.years + 1, year + 1)
+        )
+        groups = bulk_create_ordered(Group, [
+            Group(group_stream=stream, number=k)
+            for stream in streams for k in range(1, size.groups + 1)
+        ])
+        union_groups = dict(Group.objects.filter(
+            group_stream__in=streams, number=0,
+        ).values_list('group_stream', 'pk').order_by())
+        subgroups = bulk_create_ordered(SubGroup, [
+            SubGroup(group=group, numerator=k, denominator=k and 2)
+            for group in groups for k in range(3)
+        ])
+        SubGroupConflict.refresh(i.pk for i in streams)
+        # Subgroups keyed by group stream, group number and numerator, which
+        # are zero for union ones.
+        subgroup_keys = dict(((i[0], 0, 0), i[1]) for i in SubGroup.objects.filter(
+            group__in=union_groups.values(),
+        ).values_list('group__group_stream', 'pk').order_by())
+        group_numbers = {i.pk: (i.group_stream_id, i.number) for i in groups}
+        group_keys = {v: k for k, v in group_numbers.items()}
+        subgroup_keys.update(
+            (group_numbers[i.group_id] + (i.numerator,), i.pk) for i in subgroups)
+        terms = {
+            (i[0], i[1]): i[2] for i in Curriculum.objects.filter(
+                group_stream__in=streams,
+            ).values_list('group_stream', 'semester', 'start_date').order_by()
+        }
+
+        department_teachers = {}
+        for teacher in teachers:
+            department_teachers.setdefault(teacher.department_id, []).append(teacher.pk)
+        faculty_subjects = {}
+        for subject in subjects:
+            faculty_subjects.setdefault(
+                subject.department.faculty_id, []).append(subject)
+        lessons = recordings = unplaced = 0
+        timetables = set()
+        for faculty in faculties:
+            faculty_streams = [
+                i for i in streams if i.specialty.faculty_id == faculty.pk]
+            placed = []
+            records = []
+            for stream in faculty_streams:
+                atoms = [
+                    ('s', stream.pk, g, h)
+                    for g in range(1, size.groups + 1) for h in (1, 2)
+                ]
+                for semester in range(1, stream.form.semesters + 1):
+                    term = terms.get((stream.pk, semester))
+                    chosen = rng.sample(
+                        faculty_subjects[faculty.pk], size.semester_subjects)
+                    for subject in chosen:
+                        pool = department_teachers[subject.department_id]
+                        # Lectures of the whole stream, practices of every
+                        # group and laboratory of every half of a group.
+                        units = [((stream.pk, 0, 0), 0, atoms, (BOTH,))]
+                        for g in range(1, size.groups + 1):
+                            units.append((
+                                (stream.pk, g, 0), 1,
+                                [i for i in atoms if i[2] == g], (BOTH,)))
+                            weeks = [NUMERATOR, DENOMINATOR]
+                            rng.shuffle(weeks)
+                            for h in (1, 2):
+                                units.append(((stream.pk, g, h), 2, [
+                                    ('s', stream.pk, g, h)], weeks))
+                            records.append((CurriculumRecording(
+                                group_id=group_keys[stream.pk, g],
+                                semester=semester, lectures=SEMESTER_WEEKS,
+                                practices=SEMESTER_WEEKS,
+                                laboratory=SEMESTER_WEEKS // 2,
+                                independent_work=2 * SEMESTER_WEEKS,
+                            ), subject.pk))
+                        for key, kind, students, weeks in units:
+                            teacher = rng.choice(pool)
+                            lesson = Lesson(
+                                subgroup_id=subgroup_keys[key], semester=semester,
+                                subject=subject, lesson=kind, teacher_id=teacher,
+                            )
+                            resources = [(i, semester) for i in students]
+                            resources.append(('t', teacher, term))
+                            placed.append((lesson, scheduler.place(
+                                resources, term, weeks)))
+                            timetables.add((TEACHER, teacher, None))
+                    timetables.add((STREAM, stream.pk, semester))
+            bulk_create_ordered(Lesson, [i[0] for i in placed])
+            bulk_create_ordered(CurriculumRecording, [i[0] for i in records])
+            CurriculumRecording.subjects.through.objects.bulk_create(
+                CurriculumRecording.subjects.through(
+                    curriculumrecording_id=record.pk, subject_id=subject)
+                for record, subject in records
+            )
+            TimeTableRecording.objects.bulk_create(
+                TimeTableRecording(
+                    lesson_id=lesson.pk, lesson_number=place[0],
+                    classroom_id=place[1])
+                for lesson, place in placed if place is not None
+            )
+            lessons += len(placed)
+            placed_count = sum(1 for i in placed if i[1] is not None)
+            recordings += placed_count
+            unplaced += len(placed) - placed_count
+        TimeTableStamp.objects.bulk_create(
+            TimeTableStamp(group_stream_id=pk, semester=semester)
+            for owner, pk, semester in sorted(timetables) if owner == STREAM
+        )
+    # Fresh primary keys may still have timetables of a flushed database
+    # in a shared cache.
+    for owner, pk, semester in timetables:
+        invalidate_timetable(pk, semester, owner)
+    invalidate_occupancy()
+    return University(
+        len(faculties), len(streams), len(union_groups) + len(groups),
+        len(union_groups) + len(subgroups), lessons, recordings, unplaced)
@@ -9,21 +9,32 @@ from .settings import *
 from .models import (
     FormOfStudySemester,
     Curriculum,
+    TimeTableRecording,
+)
+from .intervals import overlapping_pairs, yearless_overlapping_pairs
+from .conflicts import (
+    double_booking_error,
+    find_double_bookings,
+    find_duplicate_slots,
+    find_recording_conflicts,
 )
 
 class FormOfStudySemesterFormset(forms.BaseInlineFormSet):
     def clean(self):
         super(FormOfStudySemesterFormset, self).clean()
-        count = 0
-        for ik, iv in enumerate(self.forms):
-            idr = iv.cleaned_data.get('date_range')
-            if idr is not None:
-                count += 1
-                for jk, jv in enumerate(self.forms[ik+1:]):
-                    jdr = jv.cleaned_data.get('date_range')
-                    if jdr is not None and idr.are_overlap(jdr):
-                        error = _("Date ranges are overlapping.")
-                        raise forms.ValidationError(error)
+        ranges = [
+            (k, v.cleaned_data['date_range']) for k, v in enumerate(self.forms)
+            if not self._should_delete_form(v)
+            and v.cleaned_data.get('date_range') is not None
+        ]
+        count = len(ranges)
+        pairs = yearless_overlapping_pairs(ranges)
+        for k, j in pairs:
+            error = _("Date range overlaps with date range {}.")
+            self.forms[j].add_error(None, error.format(k + 1))
+        if pairs:
+            error = _("Date ranges are overlapping.")
+            raise forms.ValidationError(error)
         if count < 1:
             name = FormOfStudySemester._meta.verbose_name
             error = _("You must have at least one {}.")
@@ -34,6 +45,26 @@ class FormOfStudySemesterFormset(forms.BaseInlineFormSet):
             error = _("You may not have {} more than {}.")
             raise forms.ValidationError(error.format(n1, n2))
 
+class CurriculumFormset(forms.BaseInlineFormSet):
+    def clean(self):
+        super(CurriculumFormset, self).clean()
+        periods = [
+            (k, v.cleaned_data['start_date'], v.cleaned_data['end_date'])
+            for k, v in enumerate(self.forms)
+            if not self._should_delete_form(v)
+            and v.cleaned_data.get('start_date') is not None
+            and v.cleaned_data.get('end_date') is not None
+        ]
+        pairs = overlapping_pairs(periods)
+        for k, j in pairs:
+            error = _("Dates of semesters {} and {} are overlapping.")
+            self.forms[j].add_error(None, error.format(
+                self.forms[k].cleaned_data.get('semester', k + 1),
+                self.forms[j].cleaned_data.get('semester', j + 1),
+            ))
+        if pairs:
+            raise forms.ValidationError(_("Date ranges are overlapping."))
+
 class CurriculumForm(forms.ModelForm):
     class Meta:
         model = Curriculum
@@ -42,3 +73,41 @@ class CurriculumForm(forms.ModelForm):
             'end_date': SuitDateWidget,
         }
         exclude = ()
+
+
+class TimeTableRecordingForm(forms.ModelForm):
+    def validate_unique(self):
+        # Conflicts and unique lesson numbers are checked by
+        # TimeTableRecordingFormset for all forms at once.
+        exclude = self._get_validation_exclusions() + ['lesson_number']
+        try:
+            self.instance.validate_unique(
+                exclude=exclude, check_conflicts=False)
+        except forms.ValidationError as e:
+            self._update_errors(e)
+
+    class Meta:
+        model = TimeTableRecording
+        exclude = ()
+
+class TimeTableRecordingFormset(forms.BaseInlineFormSet):
+    def clean(self):
+        super(TimeTableRecordingFormset, self).clean()
+        forms_list = [
+            i for i in self.forms
+            if i.is_valid() and not self._should_delete_form(i)
+            and (i.instance.pk is not None or i.has_changed())
+        ]
+        instances = [i.instance for i in forms_list]
+        errors = {}
+        for conflict in find_duplicate_slots(instances):
+            errors.setdefault(id(conflict.recording), conflict.recording.unique_error_message(
+                TimeTableRecording, ('lesson', 'lesson_number')))
+        for conflict in find_recording_conflicts(instances):
+            error = _("Duplicate time table recording by {}.")
+            errors.setdefault(id(conflict.recording), error.format(conflict.other))
+        for booking in find_double_bookings(instances):
+            errors.setdefault(id(booking.recording), double_booking_error(booking))
+        for form in forms_list:
+            if id(form.instance) in errors:
+                form.add_error(None, errors[id(form.instance)])
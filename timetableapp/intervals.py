@@ -0,0 +1,41 @@
+from heapq import heappop, heappush
+from operator import itemgetter
+
+# Packed yearless dates of the first and the last day of a year.
+YEAR_START = 1 * 32 + 1
+YEAR_END = 12 * 32 + 31
+
+
+def overlapping_pairs(intervals):
+    """
+    Return sorted ``(a, b)`` key pairs, ``a < b``, of closed intervals
+    sharing at least one point. ``intervals`` are ``(key, start, end)``
+    items, a key may repeat for an interval split into pieces. Runs in
+    O(n log n) plus the number of pairs.
+    """
+    active = []
+    pairs = set()
+    for order, (key, start, end) in enumerate(sorted(intervals, key=itemgetter(1))):
+        while active and active[0][0] < start:
+            heappop(active)
+        for other_end, other_order, other in active:
+            if other != key:
+                pairs.add((min(key, other), max(key, other)))
+        heappush(active, (end, order, key))
+    return sorted(pairs)
+
+
+def yearless_intervals(key, date_range):
+    """Split a YearlessDateRange wrapping over a new year in two intervals."""
+    start, end = date_range.start.value, date_range.end.value
+    if start <= end:
+        return [(key, start, end)]
+    return [(key, start, YEAR_END), (key, YEAR_START, end)]
+
+
+def yearless_overlapping_pairs(ranges):
+    """overlapping_pairs of ``(key, YearlessDateRange)`` items."""
+    intervals = []
+    for key, date_range in ranges:
+        intervals.extend(yearless_intervals(key, date_range))
+    return overlapping_pairs(intervals)
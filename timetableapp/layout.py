@@ -0,0 +1,123 @@
+import math
+from collections import namedtuple
+from operator import itemgetter
+
+from lesson_field.settings import (
+    DAY_NAMES, LESSONS_RANGE, MAX_LESSONS_DAY, SHORT_WEEK_NAMES, WORK_DAYS,
+)
+
+HEADER_ROWS = 2
+DAY_ROWS = 2 * MAX_LESSONS_DAY
+WEEK_ROWS = DAY_ROWS * len(WORK_DAYS)
+DAY_INDEX = {v: k for k, v in enumerate(WORK_DAYS)}
+
+# Single placed lesson. ``column`` is the index of the group column, or None
+# when the lesson is given to the whole group stream. ``week`` is the packed
+# week of the lesson field, so 1 and 2 take one row and 3 takes both rows.
+Placement = namedtuple('Placement', [
+    'column', 'numerator', 'denominator', 'week', 'day', 'lesson', 'text',
+])
+
+
+def get_row(week, day, lesson):
+    return DAY_ROWS * DAY_INDEX[day] + 2 * (lesson - 1) + week + HEADER_ROWS
+
+
+def gen_cell(data, rowspan=1, colspan=1, width="100px"):
+    return (rowspan, colspan, data, width)
+
+
+def lcm(a, b):
+    return (a * b) // math.gcd(a, b)
+
+
+def _row_headers():
+    rows = tuple([] for i in range(WEEK_ROWS + HEADER_ROWS))
+    for i in range(HEADER_ROWS):
+        rows[i].extend(gen_cell("") for j in range(3))
+    for day in WORK_DAYS:
+        rows[get_row(0, day, 1)].append(gen_cell(DAY_NAMES[day], DAY_ROWS))
+        for lesson in LESSONS_RANGE:
+            rows[get_row(0, day, lesson)].append(gen_cell(lesson, 2))
+            for week in range(2):
+                rows[get_row(week, day, lesson)].append(
+                    gen_cell(SHORT_WEEK_NAMES[week + 1]))
+    return tuple(tuple(i) for i in rows)
+
+
+# Day, lesson and week cells are the same for every timetable.
+ROW_HEADERS = _row_headers()
+
+
+def _pad(data, posl, row, rows, pos):
+    if rows == 2 and posl[row] == posl[row + 1]:
+        diff = pos - posl[row]
+        if diff > 0:
+            data[row].append(gen_cell("", 2, diff))
+            posl[row] = posl[row + 1] = pos
+        return
+    for i in range(row, row + rows):
+        diff = pos - posl[i]
+        if diff > 0:
+            data[i].append(gen_cell("", 1, diff))
+            posl[i] = pos
+
+
+def layout(columns, placements):
+    """
+    Lay out placements into table rows of ``(rowspan, colspan, data, width)``
+    cells. ``columns`` is a sequence of ``(label, parts)`` pairs, one per
+    group column, where ``parts`` is the number of subgroup headers.
+    """
+    width = 1
+    for label, parts in columns:
+        width = lcm(width, parts)
+    for i in placements:
+        if i.denominator:
+            width = lcm(width, i.denominator)
+    total = max(len(columns), 1) * width
+
+    data = tuple(list(i) for i in ROW_HEADERS)
+    posl = [0] * len(data)
+    posl[0] = posl[1] = total
+    for label, parts in columns:
+        data[0].append(gen_cell(label, 1, width))
+        for j in range(1, parts + 1):
+            data[1].append(gen_cell(j, 1, width // parts))
+    if not columns:
+        data[0].append(gen_cell("", 2, total))
+
+    cells = []
+    for i in placements:
+        if i.column is None:
+            start, colspan = 0, total
+        elif i.denominator:
+            colspan = width // i.denominator
+            start = i.column * width + colspan * (i.numerator - 1)
+        else:
+            start, colspan = i.column * width, width
+        if i.week in (1, 2):
+            row, rows = get_row(i.week - 1, i.day, i.lesson), 1
+        else:
+            row, rows = get_row(0, i.day, i.lesson), 2
+        cells.append((start, row, rows, colspan, i.text))
+    cells.sort(key=itemgetter(0))
+
+    for start, row, rows, colspan, text in cells:
+        _pad(data, posl, row, rows, start)
+        data[row].append(gen_cell(text, rows, colspan))
+        for i in range(row, row + rows):
+            posl[i] = max(posl[i], start + colspan)
+
+    for row in range(HEADER_ROWS, len(data), 2):
+        _pad(data, posl, row, 2, total)
+    return data
+
+
+def layout_many(items):
+    """
+    Lay out ``(key, (columns, placements))`` pairs, yielding ``(key, data)``
+    pairs one at a time, so only one grid is alive while they are consumed.
+    """
+    for key, (columns, placements) in items:
+        yield key, layout(columns, placements)
@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetableapp.benchmarks import BENCHMARKS, run
+from timetableapp.fake import SIZES
+
+
+class Command(BaseCommand):
+    help = (
+        "Time hot paths on generated universities of given sizes in a test "
+        "database and write results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', choices=sorted(SIZES), action='append',
+            help="Size preset, may be repeated, tiny and small by default.",
+        )
+        parser.add_argument(
+            '--benchmark', action='append',
+            help="Benchmark name, may be repeated, all by default.",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Timed repeats.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+        parser.add_argument('--output', help="Results file, stdout by default.")
+        parser.add_argument(
+            '--list', action='store_true', help="List benchmark names and exit.")
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for name in BENCHMARKS:
+                self.stdout.write(name)
+            return
+        names = options['benchmark']
+        unknown = set(names or ()) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError("Unknown benchmarks: {}.".format(', '.join(sorted(unknown))))
+
+        def report(size, results):
+            for name, timing in results.items():
+                self.stderr.write("{} {}: {:.6f}s".format(size, name, timing['best']))
+
+        results = run(
+            options['size'] or ['tiny', 'small'], names=names,
+            repeat=options['repeat'], seed=options['seed'], callback=report,
+        )
+        content = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(content + '\n')
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetableapp.benchmarks import compare
+from timetableapp.settings import BENCHMARK_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = "Compare two benchmark results and fail on regressions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('base', help="Results of the earlier run.")
+        parser.add_argument('new', help="Results of the later run.")
+        parser.add_argument(
+            '--threshold', type=float, default=BENCHMARK_THRESHOLD,
+            help="Allowed slowdown, 0.1 is 10%%.",
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for name in (options['base'], options['new']):
+            with open(name) as f:
+                results.append(json.load(f))
+        regressions = 0
+        for i in compare(*results):
+            flag = ''
+            if i.ratio > 1 + options['threshold']:
+                flag = ' REGRESSION'
+                regressions += 1
+            self.stdout.write("{:<8} {:<36} {:>12.6f} {:>12.6f} {:>+8.1%}{}".format(
+                i.size, i.name, i.base, i.new, i.ratio - 1, flag))
+        if regressions:
+            raise CommandError("{} benchmarks regressed.".format(regressions))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from timetableapp.models import FormOfStudy, GroupStream, Specialty
+
+
+class Command(BaseCommand):
+    help = "Create group streams of a year for every specialty and form of study."
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int)
+        parser.add_argument('--faculty', type=int, help="Faculty id.")
+        parser.add_argument(
+            '--specialty', type=int, action='append',
+            help="Specialty id, may be repeated.",
+        )
+        parser.add_argument(
+            '--form', type=int, action='append',
+            help="Form of study id, may be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        specialties = Specialty.objects.order_by('pk')
+        if options['faculty'] is not None:
+            specialties = specialties.filter(faculty=options['faculty'])
+        if options['specialty']:
+            specialties = specialties.filter(pk__in=options['specialty'])
+        forms = FormOfStudy.objects.order_by('pk')
+        if options['form']:
+            forms = forms.filter(pk__in=options['form'])
+        year = options['year']
+        existing = set(GroupStream.objects.filter(year=year).values_list(
+            'specialty', 'form').order_by())
+        streams = [
+            GroupStream(specialty_id=specialty, year=year, form_id=form)
+            for specialty in specialties.values_list('pk', flat=True)
+            for form in forms.values_list('pk', flat=True)
+            if (specialty, form) not in existing
+        ]
+        GroupStream.bulk_create(streams)
+        self.stdout.write("Created {} group streams.".format(len(streams)))
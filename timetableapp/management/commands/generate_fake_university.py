@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from timetableapp.fake import SIZES, generate_university
+from timetableapp.models import Building, Faculty, FormOfStudy
+
+
+class Command(BaseCommand):
+    help = "Fill an empty database with a synthetic university for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', choices=sorted(SIZES), default='small',
+            help="Size preset.",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+        parser.add_argument(
+            '--year', type=int,
+            help="Year of the latest group streams, the current one by default.",
+        )
+
+    def handle(self, *args, **options):
+        if any(i.objects.exists() for i in (Faculty, FormOfStudy, Building)):
+            raise CommandError("The database already has a university, flush it first.")
+        result = generate_university(
+            SIZES[options['size']], seed=options['seed'], year=options['year'])
+        self.stdout.write(
+            "Created {} faculties, {} group streams, {} groups, {} subgroups, "
+            "{} lessons and {} recordings, {} lessons left unplaced.".format(*result))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from timetableapp.models import Lesson
+from timetableapp.settings import SOLVER_ITERATIONS
+from timetableapp.solver import generate_timetable
+
+
+class Command(BaseCommand):
+    help = "Place time table recordings of lessons of a semester."
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int)
+        parser.add_argument('--faculty', type=int, help="Faculty id.")
+        parser.add_argument('--year', type=int, help="Group stream year.")
+        parser.add_argument('--form', type=int, help="Form of study id.")
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Drop existing recordings of the lessons instead of keeping them.",
+        )
+        parser.add_argument(
+            '--iterations', type=int, default=SOLVER_ITERATIONS,
+            help="Local search iterations.",
+        )
+        parser.add_argument('--seed', type=int, help="Random seed.")
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Processes solving independent parts of the time table.",
+        )
+
+    def handle(self, *args, **options):
+        lessons = Lesson.objects.filter(semester=options['semester'])
+        stream = 'subgroup__group__group_stream'
+        if options['faculty'] is not None:
+            lessons = lessons.filter(**{stream + '__specialty__faculty': options['faculty']})
+        if options['year'] is not None:
+            lessons = lessons.filter(**{stream + '__year': options['year']})
+        if options['form'] is not None:
+            lessons = lessons.filter(**{stream + '__form': options['form']})
+        recordings, unplaced = generate_timetable(
+            lessons, replace=options['replace'],
+            iterations=options['iterations'], seed=options['seed'], workers=options['workers'],
+        )
+        self.stdout.write("Created {} recordings, {} could not be placed.".format(
+            len(recordings), unplaced))
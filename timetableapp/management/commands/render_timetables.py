@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from timetableapp.views import iter_timetables, stream_timetables
+
+
+class Command(BaseCommand):
+    help = "Render timetables of every group stream of a semester into one HTML page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int)
+        parser.add_argument('--faculty', type=int, help="Faculty id.")
+        parser.add_argument('--year', type=int, help="Group stream year.")
+        parser.add_argument('--form', type=int, help="Form of study id.")
+        parser.add_argument(
+            '-o', '--output', help="Output file, standard output by default.",
+        )
+
+    def handle(self, *args, **options):
+        timetables = iter_timetables(
+            options['semester'], options['faculty'],
+            year=options['year'], form=options['form'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(stream_timetables(timetables))
+        else:
+            for i in stream_timetables(timetables):
+                self.stdout.write(i, ending='')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from timetableapp.rollover import rollover
+
+
+class Command(BaseCommand):
+    help = "Copy lessons and time table recordings of a semester to group streams of another year."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source_year', type=int)
+        parser.add_argument('target_year', type=int)
+        parser.add_argument('semester', type=int)
+        parser.add_argument(
+            '--target-semester', type=int,
+            help="Semester of the target group streams, the same by default.",
+        )
+        parser.add_argument('--faculty', type=int, help="Faculty id.")
+
+    def handle(self, *args, **options):
+        result = rollover(
+            options['source_year'], options['target_year'], options['semester'],
+            target_semester=options['target_semester'], faculty=options['faculty'],
+        )
+        self.stdout.write(
+            "Created {} group streams, {} groups, {} subgroups, {} lessons "
+            "and {} recordings.".format(*result[:5]))
+        if result.classrooms_dropped or result.recordings_skipped:
+            self.stdout.write(
+                "Copied {} recordings without their classroom and skipped {} "
+                "recordings double booking their teacher.".format(*result[5:]))
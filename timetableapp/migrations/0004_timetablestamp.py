@@ -0,0 +1,43 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_stamps(apps, schema_editor):
+    TimeTableRecording = apps.get_model('timetableapp', 'TimeTableRecording')
+    TimeTableStamp = apps.get_model('timetableapp', 'TimeTableStamp')
+    pairs = TimeTableRecording.objects.values_list(
+        'lesson__subgroup__group__group_stream', 'lesson__semester',
+    ).order_by().distinct()
+    TimeTableStamp.objects.bulk_create(
+        TimeTableStamp(group_stream_id=group_stream, semester=semester)
+        for group_stream, semester in pairs
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0003_auto_20200602_1711'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeTableStamp',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveSmallIntegerField(verbose_name='semester')),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='version')),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now, verbose_name='modified')),
+                ('group_stream', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timetableapp.GroupStream', verbose_name='group stream')),
+            ],
+            options={
+                'verbose_name': 'timetable stamp',
+                'verbose_name_plural': 'timetable stamps',
+                'unique_together': {('group_stream', 'semester')},
+            },
+        ),
+        migrations.RunPython(create_stamps, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0004_timetablestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher', 'semester'], name='timetableap_teacher_7e0156_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetablerecording',
+            index=models.Index(fields=['teacher', 'lesson'], name='timetableap_teacher_8fcc84_idx'),
+        ),
+    ]
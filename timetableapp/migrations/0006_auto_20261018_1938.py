@@ -0,0 +1,21 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0005_auto_20261018_1935'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timetablerecording',
+            index=models.Index(fields=['lesson_number', 'teacher'], name='timetableap_lesson__e1dea9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timetablerecording',
+            index=models.Index(fields=['lesson_number', 'classroom'], name='timetableap_lesson__717bb0_idx'),
+        ),
+    ]
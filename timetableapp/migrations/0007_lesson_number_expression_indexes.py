@@ -0,0 +1,50 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:12
+
+from django.db import migrations
+
+# Same arithmetic as lesson_number__week and lesson_number__day compile to,
+# so the planner matches them. Django 2.2 has no expression indexes.
+INDEXES = (
+    ('timetableapp_ttr_week_idx', '({column} {div} 256)'),
+    ('timetableapp_ttr_day_idx', '(({column} {div} 32) - (({column} {div} 256) * 8))'),
+)
+VENDORS = ('sqlite', 'postgresql', 'mysql')
+
+
+def create_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in VENDORS:
+        return
+    TimeTableRecording = apps.get_model('timetableapp', 'TimeTableRecording')
+    table = schema_editor.quote_name(TimeTableRecording._meta.db_table)
+    column = schema_editor.quote_name('lesson_number')
+    div = 'DIV' if connection.vendor == 'mysql' else '/'
+    for name, expression in INDEXES:
+        schema_editor.execute('CREATE INDEX %s ON %s ((%s))' % (
+            schema_editor.quote_name(name), table,
+            expression.format(column=column, div=div),
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor not in VENDORS:
+        return
+    TimeTableRecording = apps.get_model('timetableapp', 'TimeTableRecording')
+    table = schema_editor.quote_name(TimeTableRecording._meta.db_table)
+    for name, expression in INDEXES:
+        sql = 'DROP INDEX %s' % schema_editor.quote_name(name)
+        if connection.vendor == 'mysql':
+            sql += ' ON %s' % table
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0006_auto_20261018_1938'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
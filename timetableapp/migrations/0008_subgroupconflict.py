@@ -0,0 +1,58 @@
+# Generated by Django 2.2.10 on 2026-10-18 19:52
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_conflicts(apps, schema_editor):
+    # Closure of SubGroup.get_conflict_subgroups as of this migration.
+    SubGroup = apps.get_model('timetableapp', 'SubGroup')
+    SubGroupConflict = apps.get_model('timetableapp', 'SubGroupConflict')
+    rows = list(SubGroup.objects.values_list(
+        'pk', 'group', 'group__group_stream', 'group__number',
+        'numerator', 'denominator',
+    ).order_by())
+    group_subgroups = defaultdict(list)
+    stream_groups = defaultdict(dict)
+    for pk, group, group_stream, number, numerator, denominator in rows:
+        group_subgroups[group].append((pk, numerator == 0 and denominator == 0))
+        stream_groups[group_stream][group] = number
+    conflicts = []
+    for pk, group, group_stream, number, numerator, denominator in rows:
+        own = group_subgroups[group]
+        if numerator == 0 and denominator == 0:
+            others = {i for i, union in own}
+        else:
+            others = {i for i, union in own if union}
+            for other, other_number in stream_groups[group_stream].items():
+                if other != group and (number == 0 or other_number == 0):
+                    others.update(i for i, union in group_subgroups[other])
+        conflicts.extend(
+            SubGroupConflict(subgroup_id=pk, other_id=i) for i in others)
+    SubGroupConflict.objects.bulk_create(conflicts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0007_lesson_number_expression_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubGroupConflict',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflicted_by', to='timetableapp.SubGroup', verbose_name='conflict subgroup')),
+                ('subgroup', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conflicts', to='timetableapp.SubGroup', verbose_name='subgroup')),
+            ],
+            options={
+                'verbose_name': 'subgroup conflict',
+                'verbose_name_plural': 'subgroup conflicts',
+                'unique_together': {('subgroup', 'other')},
+            },
+        ),
+        migrations.RunPython(create_conflicts, migrations.RunPython.noop),
+    ]
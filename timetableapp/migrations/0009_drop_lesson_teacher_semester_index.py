@@ -0,0 +1,17 @@
+# Generated by Django 2.2.10 on 2026-10-18 20:56
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetableapp', '0008_subgroupconflict'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lesson',
+            name='timetableap_teacher_7e0156_idx',
+        ),
+    ]
@@ -1,8 +1,10 @@
 from datetime import date
 
-from django.db import models
+from django.db import models, IntegrityError, transaction
 # from django.db.models import Max
+from django.db.models import F
 from django.db.models.query import Q
+from django.utils import timezone
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ValidationError
@@ -302,6 +304,32 @@ class FormOfStudySemester(models.Model):
         verbose_name_plural = _('semester date ranges')
 
 
+def semester_dates(year, semesters, date_ranges):
+    """
+    Return (start, end) dates of every semester of a group stream
+    starting in ``year``, cycling through default ``date_ranges`` of its
+    form of study and moving to later years to keep dates increasing.
+    """
+    result = []
+    if not date_ranges:
+        return result
+    last_date = date(year - 1, 1, 1)
+    for i in range(semesters):
+        date_range = date_ranges[i % len(date_ranges)]
+        std = date(year, date_range.start.month, date_range.start.day)
+        while std < last_date:
+            year += 1
+            std = date(year, date_range.start.month, date_range.start.day)
+        last_date = std
+        etd = date(year, date_range.end.month, date_range.end.day)
+        while etd < last_date:
+            year += 1
+            etd = date(year, date_range.end.month, date_range.end.day)
+        last_date = etd
+        result.append((std, etd))
+    return result
+
+
 class GroupStream(ReadOnlyOnExistForeignKey, models.Model):
     specialty = models.ForeignKey(
         'Specialty',
@@ -338,34 +366,64 @@ class GroupStream(ReadOnlyOnExistForeignKey, models.Model):
             new = True
         super(GroupStream, self).save(*args, **kwargs)
         if new and form:
-            objs = FormOfStudySemester.objects.filter(form=form)
-            if objs.exists():
-                count = objs.count()
-                year = self.year
-                semesters = self.form.semesters
-                last_date = date(year - 1, 1, 1)
-                for i in range(1, semesters + 1):
-                    date_range = objs[(i - 1) % count].date_range
-                    std = date(year, date_range.start.month, date_range.start.day)
-                    while std < last_date:
-                        year += 1
-                        std = date(year, date_range.start.month, date_range.start.day)
-                    last_date = std
-                    etd = date(year, date_range.end.month, date_range.end.day)
-                    while etd < last_date:
-                        year += 1
-                        etd = date(year, date_range.end.month, date_range.end.day)
-                    last_date = etd
-                    args_dict = {
-                        'group_stream': self,
-                        'semester': i,
-                        'start_date': std,
-                        'end_date': etd,
-                    }
-                    Curriculum.objects.create(**args_dict)
+            date_ranges = [
+                i.date_range for i in
+                FormOfStudySemester.objects.filter(form=form).order_by('pk')
+            ]
+            for i, (std, etd) in enumerate(
+                    semester_dates(self.year, form.semesters, date_ranges), 1):
+                Curriculum.objects.create(
+                    group_stream=self, semester=i, start_date=std, end_date=etd,
+                )
         if not Group.objects.filter(group_stream=self).exists():
             Group.objects.create(group_stream=self)
 
+    @classmethod
+    def bulk_create(cls, streams):
+        """
+        Create new group streams with their curricula, union groups and
+        union subgroups the way save does, with a constant number of
+        queries in one transaction.
+        """
+        streams = list(streams)
+        with transaction.atomic():
+            cls.objects.bulk_create(streams)
+            if any(i.pk is None for i in streams):
+                keys = dict(((i[1], i[2], i[3]), i[0]) for i in cls.objects.filter(
+                    specialty__in={i.specialty_id for i in streams},
+                    year__in={i.year for i in streams},
+                    form__in={i.form_id for i in streams},
+                ).values_list('pk', 'specialty', 'year', 'form').order_by())
+                for i in streams:
+                    i.pk = keys[i.specialty_id, i.year, i.form_id]
+            forms = FormOfStudy.objects.in_bulk({i.form_id for i in streams})
+            date_ranges = {}
+            for i in FormOfStudySemester.objects.filter(
+                    form__in=forms).order_by('pk'):
+                date_ranges.setdefault(i.form_id, []).append(i.date_range)
+            Curriculum.objects.bulk_create(
+                Curriculum(
+                    group_stream=stream, semester=k,
+                    start_date=std, end_date=etd,
+                )
+                for stream in streams
+                for k, (std, etd) in enumerate(semester_dates(
+                    stream.year, forms[stream.form_id].semesters,
+                    date_ranges.get(stream.form_id, []),
+                ), 1)
+            )
+            groups = [Group(group_stream=i) for i in streams]
+            Group.objects.bulk_create(groups)
+            if any(i.pk is None for i in groups):
+                keys = dict(Group.objects.filter(
+                    group_stream__in=streams, number=0,
+                ).values_list('group_stream', 'pk').order_by())
+                for i in groups:
+                    i.pk = keys[i.group_stream_id]
+            SubGroup.objects.bulk_create(SubGroup(group=i) for i in groups)
+            SubGroupConflict.refresh(i.pk for i in streams)
+        return streams
+
     def get_union_group(self):
         group = self.group_set.filter(number=0).first()
         if not group:
@@ -649,9 +707,8 @@ class Lesson(ReadOnlyOnExistForeignKey, models.Model):
     # TODO: clean on techer in wrong department
 
     def get_conflicting(self):
-        subgroup = self.subgroup
-        conflict = subgroup.get_conflict_subgroups()
-        pks = conflict.values("pk")
+        pks = SubGroupConflict.objects.filter(
+            subgroup=self.subgroup_id).values('other')
         return Lesson.objects.exclude(pk=self.pk).filter(
             subgroup__in=pks,
             semester=self.semester,
@@ -726,13 +783,20 @@ class TimeTableRecording(models.Model):
         null=True,
     )
 
-    def validate_unique(self, exclude=None):
-        # TODO: check num/denom and both
-        confliting = self.lesson.get_conflicting().values('pk')
-        filt = TimeTableRecording.objects.filter(lesson__in=confliting)
-        if filt.exclude(pk=self.pk).exists():
-            error = _("Duplicate time table recording by {}.")
-            raise ValidationError(error.format(filt.first()))
+    def validate_unique(self, exclude=None, check_conflicts=True):
+        # Formsets pass check_conflicts=False and check all forms at once.
+        if check_conflicts:
+            from timetableapp.conflicts import (
+                double_booking_error, find_double_bookings,
+                find_recording_conflicts,
+            )
+            conflicts = find_recording_conflicts([self])
+            if conflicts:
+                error = _("Duplicate time table recording by {}.")
+                raise ValidationError(error.format(conflicts[0].other))
+            bookings = find_double_bookings([self])
+            if bookings:
+                raise ValidationError(double_booking_error(bookings[0]))
         super().validate_unique(exclude)
 
     def __str__(self):
@@ -742,7 +806,104 @@ class TimeTableRecording(models.Model):
         verbose_name = _('timetable recording')
         verbose_name_plural = _('timetable recordings')
         unique_together = (('lesson', 'lesson_number'),)
+        indexes = [
+            models.Index(fields=['teacher', 'lesson']),
+            models.Index(fields=['lesson_number', 'teacher']),
+            models.Index(fields=['lesson_number', 'classroom']),
+        ]
         ordering = [
             'lesson__subgroup__denominator',
             'lesson__subgroup__numerator',
         ]
+
+
+class SubGroupConflict(models.Model):
+    """
+    Closure of SubGroup.get_conflict_subgroups: ``other`` is a conflict
+    subgroup of ``subgroup``. Rows of a group stream are rebuilt when its
+    groups or subgroups are saved and go away with them on delete.
+    """
+    subgroup = models.ForeignKey(
+        'SubGroup',
+        on_delete=models.CASCADE,
+        verbose_name=_('subgroup'),
+        related_name='conflicts',
+    )
+    other = models.ForeignKey(
+        'SubGroup',
+        on_delete=models.CASCADE,
+        verbose_name=_('conflict subgroup'),
+        related_name='conflicted_by',
+    )
+
+    @classmethod
+    def refresh(cls, group_streams):
+        """Rebuild rows of subgroups of given group stream primary keys."""
+        from timetableapp.conflicts import SubGroupHierarchy
+        group_streams = {i for i in group_streams if i is not None}
+        if not group_streams:
+            return
+        hierarchy = SubGroupHierarchy.load_streams(group_streams)
+        with transaction.atomic():
+            cls.objects.filter(
+                Q(subgroup__group__group_stream__in=group_streams)
+                | Q(other__group__group_stream__in=group_streams)
+            ).delete()
+            cls.objects.bulk_create(
+                cls(subgroup_id=a, other_id=b)
+                for a in hierarchy.subgroups
+                for b in hierarchy.conflict_subgroups(a)
+            )
+
+    def __str__(self):
+        return '%s - %s' % (self.subgroup_id, self.other_id)
+
+    class Meta:
+        verbose_name = _('subgroup conflict')
+        verbose_name_plural = _('subgroup conflicts')
+        unique_together = (('subgroup', 'other'),)
+
+
+class TimeTableStamp(models.Model):
+    """Change counter of the timetable of a group stream semester."""
+    group_stream = models.ForeignKey(
+        'GroupStream',
+        on_delete=models.CASCADE,
+        verbose_name=_('group stream'),
+    )
+    semester = models.PositiveSmallIntegerField(
+        verbose_name=_('semester'),
+    )
+    version = models.PositiveIntegerField(
+        verbose_name=_('version'),
+        default=1,
+    )
+    modified = models.DateTimeField(
+        verbose_name=_('modified'),
+        default=timezone.now,
+    )
+
+    @classmethod
+    def touch(cls, group_stream_id, semester, create=True):
+        query = cls.objects.filter(
+            group_stream_id=group_stream_id, semester=semester,
+        )
+        if query.update(version=F('version') + 1, modified=timezone.now()):
+            return
+        if not create:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    group_stream_id=group_stream_id, semester=semester,
+                )
+        except IntegrityError:
+            query.update(version=F('version') + 1, modified=timezone.now())
+
+    def __str__(self):
+        return '%s - %s' % (self.group_stream_id, self.semester)
+
+    class Meta:
+        verbose_name = _('timetable stamp')
+        verbose_name_plural = _('timetable stamps')
+        unique_together = (('group_stream', 'semester'),)
@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+from lesson_field.functions import SlotValue
+from lesson_field.helpers import decode, slot_mask
+
+from timetableapp import cache
+from timetableapp.conflicts import on_date
+from timetableapp.models import Classroom, TimeTableRecording
+
+# Occupied slots of one classroom as a lesson_field.helpers.slot_mask bitmap.
+Occupancy = namedtuple('Occupancy', ['classroom', 'building', 'name', 'mask'])
+
+
+def build_occupancy(day):
+    masks = {}
+    rows = list(on_date(TimeTableRecording.objects.filter(
+        classroom__isnull=False,
+    ), day).values_list(
+        'classroom', SlotValue('lesson_number'),
+    ).order_by().distinct())
+    weeks, days, lessons = decode([i[1] for i in rows])
+    for (classroom, value), week, weekday, lesson in zip(
+            rows, weeks, days, lessons):
+        if lesson:
+            mask = slot_mask(week, weekday, lesson)
+            masks[classroom] = masks.get(classroom, 0) | mask
+    classrooms = Classroom.objects.select_related('building')
+    return [
+        Occupancy(i.pk, i.building_id, str(i), masks.get(i.pk, 0))
+        for i in classrooms
+    ]
+
+
+def get_occupancy(day):
+    """Return Occupancy of every classroom at a date."""
+    occupancy = cache.get_occupancy(day)
+    if occupancy is None:
+        occupancy = build_occupancy(day)
+        cache.set_occupancy(day, occupancy)
+    return occupancy
+
+
+def free_classrooms(date, week, day, lesson, building=None):
+    """Return Occupancy of classrooms which are free in a slot at a date."""
+    mask = slot_mask(week, day, lesson)
+    return [
+        i for i in get_occupancy(date)
+        if not i.mask & mask and (building is None or i.building == building)
+    ]
@@ -0,0 +1,220 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from timetableapp.bulk import bulk_create, bulk_create_ordered
+from timetableapp.conflicts import find_double_bookings
+from timetableapp.models import (
+    FormOfStudySemester, Group, GroupStream, Lesson, SubGroup,
+    SubGroupConflict, TimeTableRecording, semester_dates,
+)
+from timetableapp.signals import recording_timetables, refresh_timetables
+
+# Numbers of rows created by rollover, of recordings copied without their
+# classroom and of recordings not copied, which would double book them.
+Rollover = namedtuple('Rollover', [
+    'group_streams', 'groups', 'subgroups', 'lessons', 'recordings',
+    'classrooms_dropped', 'recordings_skipped',
+])
+
+
+def _replace_year(value, years):
+    try:
+        return value.replace(year=value.year + years)
+    except ValueError:
+        return value.replace(year=value.year + years, day=28)
+
+
+class DateShift:
+    """
+    Move dates of a semester of one group stream to the same position of a
+    semester of another, using default semester ranges of their forms of
+    study, or whole years when there are none.
+    """
+
+    def __init__(self, date_ranges, source, target, semester, target_semester):
+        self.years = target.year - source.year
+        self.source = self.period(date_ranges, source, semester)
+        self.target = self.period(date_ranges, target, target_semester)
+
+    @staticmethod
+    def period(date_ranges, stream, semester):
+        dates = semester_dates(
+            stream.year, stream.form.semesters, date_ranges.get(stream.form_id, []))
+        if 0 < semester <= len(dates):
+            return dates[semester - 1]
+        return None
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        if self.source is None or self.target is None:
+            return _replace_year(value, self.years)
+        value = self.target[0] + (value - self.source[0])
+        return min(max(value, self.target[0]), self.target[1])
+
+
+def resolve_double_bookings(recordings):
+    """
+    Drop the classroom of new recordings which double book it and leave
+    out the ones which double book their teacher, checking each against
+    saved recordings and earlier ones it keeps. Return kept recordings and
+    the number of dropped classrooms.
+    """
+    position = {id(v): k for k, v in enumerate(recordings)}
+    bookings = defaultdict(list)
+    for booking in find_double_bookings(recordings):
+        bookings[id(booking.recording)].append(booking)
+    skipped = set()
+    dropped = set()
+
+    def clashes(recording, booking):
+        other = booking.other
+        if id(other) not in position:
+            return True
+        if position[id(other)] > position[id(recording)] or id(other) in skipped:
+            return False
+        return booking.field == 'teacher' or id(other) not in dropped
+
+    for recording in recordings:
+        found = {
+            i.field for i in bookings[id(recording)] if clashes(recording, i)}
+        if 'teacher' in found:
+            skipped.add(id(recording))
+        elif 'classroom' in found:
+            dropped.add(id(recording))
+            recording.classroom_id = None
+    kept = [i for i in recordings if id(i) not in skipped]
+    return kept, len(dropped)
+
+
+def rollover(source_year, target_year, semester, target_semester=None,
+             faculty=None):
+    """
+    Copy lessons and time table recordings of a semester of group streams
+    of ``source_year`` to group streams of ``target_year`` with the same
+    specialty and form of study, creating missing group streams, groups
+    and subgroups. Rows which already exist are not copied again, and
+    recordings are copied without double booking a teacher or classroom.
+    """
+    if target_semester is None:
+        target_semester = semester
+    with transaction.atomic():
+        sources = GroupStream.objects.filter(year=source_year).select_related('form')
+        if faculty is not None:
+            sources = sources.filter(specialty__faculty=faculty)
+        sources = list(sources)
+        targets = {
+            (i.specialty_id, i.form_id): i
+            for i in GroupStream.objects.filter(
+                year=target_year,
+                specialty__in={i.specialty_id for i in sources},
+            ).select_related('form')
+        }
+        streams = [
+            GroupStream(specialty_id=i.specialty_id, year=target_year, form=i.form)
+            for i in sources if (i.specialty_id, i.form_id) not in targets
+        ]
+        GroupStream.bulk_create(streams)
+        targets.update(((i.specialty_id, i.form_id), i) for i in streams)
+        stream_map = {i.pk: targets[i.specialty_id, i.form_id] for i in sources}
+
+        rows = SubGroup.objects.filter(group__group_stream__in=sources).values_list(
+            'pk', 'group__group_stream', 'group__number', 'numerator', 'denominator',
+        ).order_by()
+        rows = [(pk, stream_map[stream].pk, number, numerator, denominator)
+                for pk, stream, number, numerator, denominator in rows]
+        group_keys = {
+            (i[0], i[1]): i[2] for i in Group.objects.filter(
+                group_stream__in=[i.pk for i in stream_map.values()],
+            ).values_list('group_stream', 'number', 'pk').order_by()
+        }
+        groups = [
+            Group(group_stream_id=stream, number=number)
+            for stream, number in sorted({(i[1], i[2]) for i in rows})
+            if (stream, number) not in group_keys
+        ]
+        bulk_create(Group, groups, ('group_stream_id', 'number'))
+        group_keys.update(((i.group_stream_id, i.number), i.pk) for i in groups)
+
+        subgroup_keys = {
+            (i[0], i[1], i[2]): i[3] for i in SubGroup.objects.filter(
+                group__in=group_keys.values(),
+            ).values_list('group', 'numerator', 'denominator', 'pk').order_by()
+        }
+        # New groups get their union subgroup, as Group.save does.
+        needed = {(i.pk, 0, 0) for i in groups}
+        needed.update(
+            (group_keys[stream, number], numerator, denominator)
+            for pk, stream, number, numerator, denominator in rows
+        )
+        subgroups = [
+            SubGroup(group_id=group, numerator=numerator, denominator=denominator)
+            for group, numerator, denominator in sorted(needed)
+            if (group, numerator, denominator) not in subgroup_keys
+        ]
+        bulk_create(SubGroup, subgroups, ('group_id', 'numerator', 'denominator'))
+        subgroup_keys.update(
+            ((i.group_id, i.numerator, i.denominator), i.pk) for i in subgroups)
+        SubGroupConflict.refresh({i.pk for i in stream_map.values()})
+        subgroup_map = {
+            pk: subgroup_keys[group_keys[stream, number], numerator, denominator]
+            for pk, stream, number, numerator, denominator in rows
+        }
+
+        existing = {}
+        for row in Lesson.objects.filter(
+                subgroup__in=set(subgroup_map.values()), semester=target_semester,
+        ).values_list('subgroup', 'subject', 'lesson', 'teacher', 'pk').order_by('pk'):
+            existing.setdefault(row[:4], row[4])
+        source_lessons = [
+            (row[0], (subgroup_map[row[1]],) + row[2:])
+            for row in Lesson.objects.filter(
+                subgroup__in=subgroup_map, semester=semester,
+            ).values_list('pk', 'subgroup', 'subject', 'lesson', 'teacher').order_by('pk')
+        ]
+        lessons = {}
+        for pk, key in source_lessons:
+            if key not in existing and key not in lessons:
+                subgroup, subject, lesson, teacher = key
+                lessons[key] = Lesson(
+                    subgroup_id=subgroup, semester=target_semester,
+                    subject_id=subject, lesson=lesson, teacher_id=teacher,
+                )
+        bulk_create_ordered(Lesson, list(lessons.values()))
+        existing.update((k, v.pk) for k, v in lessons.items())
+        lesson_map = {pk: existing[key] for pk, key in source_lessons}
+
+        date_ranges = {}
+        for i in FormOfStudySemester.objects.filter(
+                form__in={i.form_id for i in sources}).order_by('pk'):
+            date_ranges.setdefault(i.form_id, []).append(i.date_range)
+        shifts = {
+            i.pk: DateShift(date_ranges, i, stream_map[i.pk], semester, target_semester)
+            for i in sources
+        }
+        taken = set(TimeTableRecording.objects.filter(
+            lesson__in=set(lesson_map.values()),
+        ).values_list('lesson', 'lesson_number').order_by())
+        recordings = []
+        for row in TimeTableRecording.objects.filter(lesson__in=lesson_map).values_list(
+                'lesson', 'lesson_number', 'classroom', 'teacher', 'start_date',
+                'end_date', 'lesson__subgroup__group__group_stream',
+        ).order_by('pk'):
+            lesson, number, classroom, teacher, start, end, stream = row
+            lesson = lesson_map[lesson]
+            if (lesson, number) in taken:
+                continue
+            taken.add((lesson, number))
+            shift = shifts[stream]
+            recordings.append(TimeTableRecording(
+                lesson_id=lesson, lesson_number=number, classroom_id=classroom,
+                teacher_id=teacher, start_date=shift(start), end_date=shift(end),
+            ))
+        # The target semester may overlap other semesters already in use.
+        copied, dropped = resolve_double_bookings(recordings)
+        TimeTableRecording.objects.bulk_create(copied)
+        refresh_timetables(recording_timetables(lesson__in=set(lesson_map.values())))
+    return Rollover(
+        len(streams), len(groups), len(subgroups), len(lessons), len(copied),
+        dropped, len(recordings) - len(copied))
@@ -6,6 +6,11 @@ START_YEAR = getattr(settings, 'TIMETABLEAPP_START_YEAR', 1900)
 FUTURE_DIFF = getattr(settings, 'TIMETABLEAPP_FUTURE_DIFF', 5)
 MAX_GROUP_TREE_HEIGHT = getattr(settings, 'TIMETABLEAPP_MAX_GROUP_TREE_HEIGHT', 3)
 LIST_PER_PAGE = getattr(settings, 'TIMETABLEAPP_LIST_PER_PAGE', 20)
+CACHE_ALIAS = getattr(settings, 'TIMETABLEAPP_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'TIMETABLEAPP_CACHE_TIMEOUT', 24 * 60 * 60)
+SEMESTER_WEEKS = getattr(settings, 'TIMETABLEAPP_SEMESTER_WEEKS', 16)
+SOLVER_ITERATIONS = getattr(settings, 'TIMETABLEAPP_SOLVER_ITERATIONS', 20000)
+BENCHMARK_THRESHOLD = getattr(settings, 'TIMETABLEAPP_BENCHMARK_THRESHOLD', 0.1)
 
 def current_year():
     return datetime.date.today().year
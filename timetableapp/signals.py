@@ -0,0 +1,149 @@
+from django.db.models.signals import (
+    pre_save, post_save, pre_delete, post_delete,
+)
+
+from timetableapp.cache import (
+    STREAM, TEACHER, invalidate_timetable, invalidate_occupancy,
+)
+from timetableapp.models import (
+    Curriculum,
+    Department,
+    Subject,
+    Person,
+    Teacher,
+    Specialty,
+    FormOfStudy,
+    GroupStream,
+    Group,
+    SubGroup,
+    SubGroupConflict,
+    Building,
+    Classroom,
+    Lesson,
+    TimeTableRecording,
+    TimeTableStamp,
+)
+
+# Path from TimeTableRecording to every model shown in a rendered timetable.
+TIMETABLE_LOOKUPS = {
+    TimeTableRecording: 'pk',
+    Lesson: 'lesson',
+    SubGroup: 'lesson__subgroup',
+    Group: 'lesson__subgroup__group',
+    GroupStream: 'lesson__subgroup__group__group_stream',
+    Specialty: 'lesson__subgroup__group__group_stream__specialty',
+    FormOfStudy: 'lesson__subgroup__group__group_stream__form',
+    Subject: 'lesson__subject',
+    Department: 'lesson__subject__department',
+    Teacher: 'teacher',
+    Person: 'teacher__person',
+    Classroom: 'classroom',
+    Building: 'classroom__building',
+}
+
+# Models whose rows change classroom occupancy. Curriculum dates bound the
+# periods of recordings without their own dates.
+OCCUPANCY_MODELS = (
+    TimeTableRecording, Lesson, Building, Classroom, Curriculum,
+)
+
+
+def affected_timetables(model, pk):
+    """
+    Return (owner, pk, period) of timetables which display row ``pk``, the
+    period being None for every period of the owner.
+    """
+    if pk is None:
+        return set()
+    return recording_timetables(**{TIMETABLE_LOOKUPS[model]: pk})
+
+
+def recording_timetables(**lookup):
+    rows = TimeTableRecording.objects.filter(**lookup).values_list(
+        'lesson__subgroup__group__group_stream', 'lesson__semester',
+        'teacher', 'lesson__teacher',
+    ).order_by().distinct()
+    affected = set()
+    for group_stream, semester, teacher, lesson_teacher in rows:
+        affected.add((STREAM, group_stream, semester))
+        if teacher or lesson_teacher:
+            # Teacher timetables are cached per date, so drop all of them.
+            affected.add((TEACHER, teacher or lesson_teacher, None))
+    return affected
+
+
+def remember_timetables(sender, instance, **kwargs):
+    # Collect timetables before the row changes, so moving a recording to
+    # another lesson or deleting it with its cascade refreshes the old ones.
+    instance._affected_timetables = affected_timetables(sender, instance.pk)
+
+
+def invalidate_timetables(sender, instance, **kwargs):
+    affected = getattr(instance, '_affected_timetables', set())
+    saved = kwargs.get('signal') is post_save
+    if saved:
+        affected |= affected_timetables(sender, instance.pk)
+    for owner, pk, period in affected:
+        invalidate_timetable(pk, period, owner)
+        if owner == STREAM:
+            # Deletion may cascade from the group stream itself, so its
+            # stamp must not be recreated there.
+            TimeTableStamp.touch(pk, period, create=saved)
+    instance._affected_timetables = set()
+
+
+def refresh_timetables(affected):
+    """
+    Invalidate timetables after bulk changes, which send no signals.
+    ``affected`` is a set of recording_timetables results.
+    """
+    for owner, pk, period in affected:
+        invalidate_timetable(pk, period, owner)
+        if owner == STREAM:
+            TimeTableStamp.touch(pk, period)
+    invalidate_occupancy()
+
+
+def curriculum_changed(sender, instance, **kwargs):
+    # Teacher timetables pick recordings by the dates of their curriculum.
+    affected = recording_timetables(
+        lesson__subgroup__group__group_stream=instance.group_stream_id,
+        lesson__semester=instance.semester,
+    )
+    for owner, pk, period in affected:
+        if owner == TEACHER:
+            invalidate_timetable(pk, period, owner)
+
+
+def occupancy_changed(sender, **kwargs):
+    invalidate_occupancy()
+
+
+def subgroup_saved(sender, instance, **kwargs):
+    # Deleted subgroups take their closure rows with them and conflicts of
+    # the others do not depend on them, so only saves rebuild the closure.
+    if sender is SubGroup:
+        group_streams = Group.objects.filter(pk=instance.group_id).values_list(
+            'group_stream', flat=True)
+    else:
+        group_streams = [instance.group_stream_id]
+    SubGroupConflict.refresh(group_streams)
+
+
+def connect_signals():
+    for model in TIMETABLE_LOOKUPS:
+        uid = 'timetableapp_timetable_%s' % model.__name__
+        pre_save.connect(remember_timetables, model, dispatch_uid=uid)
+        pre_delete.connect(remember_timetables, model, dispatch_uid=uid)
+        post_save.connect(invalidate_timetables, model, dispatch_uid=uid)
+        post_delete.connect(invalidate_timetables, model, dispatch_uid=uid)
+    uid = 'timetableapp_timetable_Curriculum'
+    post_save.connect(curriculum_changed, Curriculum, dispatch_uid=uid)
+    post_delete.connect(curriculum_changed, Curriculum, dispatch_uid=uid)
+    for model in OCCUPANCY_MODELS:
+        uid = 'timetableapp_occupancy_%s' % model.__name__
+        post_save.connect(occupancy_changed, model, dispatch_uid=uid)
+        post_delete.connect(occupancy_changed, model, dispatch_uid=uid)
+    for model in (Group, SubGroup):
+        uid = 'timetableapp_conflicts_%s' % model.__name__
+        post_save.connect(subgroup_saved, model, dispatch_uid=uid)
@@ -0,0 +1,409 @@
+import math
+import random
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+from django.db.models import Q
+
+from lesson_field.helpers import Lesson as LessonNumber
+from lesson_field.settings import LESSONS_RANGE, WORK_DAYS
+
+from timetableapp.conflicts import SubGroupHierarchy, with_periods
+from timetableapp.models import (
+    Classroom, Curriculum, CurriculumRecording, TimeTableRecording,
+)
+from timetableapp.settings import SEMESTER_WEEKS, SOLVER_ITERATIONS
+from timetableapp.signals import recording_timetables, refresh_timetables
+
+SLOTS = [(day, lesson) for day in WORK_DAYS for lesson in LESSONS_RANGE]
+NUMERATOR, DENOMINATOR, BOTH = 0b01, 0b10, 0b11
+WEEK_BITS = {NUMERATOR: (0,), DENOMINATOR: (1,), BOTH: (0, 1)}
+# CurriculumRecording field with the amount of every Lesson.lesson choice.
+LESSON_AMOUNTS = ('lectures', 'practices', 'laboratory')
+# Cost of a later lesson of a day, far below the cost of one clash.
+LATE_COST = 0.001
+ROOM_TRIES = 5
+
+Problem = namedtuple('Problem', ['tasks', 'fixed', 'rooms', 'lessons'])
+
+
+class Task:
+    """
+    Recording to place. ``resources`` are teacher and student atoms it
+    takes, ``both`` tells whether it takes both weeks or has to get one.
+    """
+    __slots__ = ('lesson', 'both', 'resources', 'slot', 'week', 'room')
+
+    def __init__(self, lesson, both, resources, slot=None, week=None, room=None):
+        self.lesson = lesson
+        self.both = both
+        self.resources = resources
+        self.slot = slot
+        self.week = week
+        self.room = room
+
+
+class Solver:
+    """
+    Greedy construction followed by local search over lesson slots and
+    classrooms, counting every shared teacher, student atom or classroom
+    in an overlapping week as one clash.
+    """
+
+    def __init__(self, tasks, fixed=(), rooms=(), seed=None):
+        self.tasks = list(tasks)
+        self.fixed = list(fixed)
+        self.rooms = [('r', i) for i in rooms]
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        for task in self.fixed:
+            self.add(task)
+
+    def task_resources(self, task, room=None):
+        room = task.room if room is None else room
+        if room is None:
+            return task.resources
+        return task.resources + (room,)
+
+    def cost(self, resources, slot, week):
+        counts = self.counts
+        return sum(
+            counts[i, slot, bit] for i in resources for bit in WEEK_BITS[week]
+        )
+
+    def add(self, task):
+        for i in self.task_resources(task):
+            for bit in WEEK_BITS[task.week]:
+                self.counts[i, task.slot, bit] += 1
+
+    def remove(self, task):
+        for i in self.task_resources(task):
+            for bit in WEEK_BITS[task.week]:
+                self.counts[i, task.slot, bit] -= 1
+
+    def clashes(self, task):
+        resources = self.task_resources(task)
+        own = len(resources) * len(WEEK_BITS[task.week])
+        return self.cost(resources, task.slot, task.week) - own
+
+    def find_room(self, slot, week, current=None):
+        if not self.rooms:
+            return None, 0
+        if current is not None and not self.cost((current,), slot, week):
+            return current, 0
+        start = self.random.randrange(len(self.rooms))
+        best = None
+        for i in range(len(self.rooms)):
+            room = self.rooms[(start + i) % len(self.rooms)]
+            cost = self.cost((room,), slot, week)
+            if not cost:
+                return room, 0
+            if best is None or cost < best[1]:
+                best = (room, cost)
+        return best
+
+    def options(self, task):
+        weeks = (BOTH,) if task.both else (NUMERATOR, DENOMINATOR)
+        options = []
+        for slot, (day, lesson) in enumerate(SLOTS):
+            for week in weeks:
+                cost = self.cost(task.resources, slot, week)
+                cost += LATE_COST * (lesson - 1)
+                options.append((cost, self.random.random(), slot, week))
+        options.sort()
+        return options
+
+    def best_placement(self, task):
+        best = None
+        for cost, order, slot, week in self.options(task)[:ROOM_TRIES]:
+            room, room_cost = self.find_room(slot, week, task.room)
+            if best is None or cost + room_cost < best[0]:
+                best = (cost + room_cost, slot, week, room)
+            if not room_cost:
+                break
+        return best
+
+    def repair_rooms(self):
+        # Parts solved apart share classrooms, move clashing ones first.
+        for task in self.tasks:
+            own = len(WEEK_BITS[task.week or BOTH])
+            if task.room is not None and self.cost((task.room,), task.slot, task.week) > own:
+                self.remove(task)
+                task.room = self.find_room(task.slot, task.week)[0]
+                self.add(task)
+
+    def place(self, task, slot, week, room):
+        task.slot, task.week, task.room = slot, week, room
+        self.add(task)
+
+    def construct(self):
+        load = Counter(i for task in self.tasks for i in task.resources)
+        order = sorted(self.tasks, key=lambda task: (
+            -max((load[i] for i in task.resources), default=0),
+            not task.both, self.random.random(),
+        ))
+        for task in order:
+            cost, slot, week, room = self.best_placement(task)
+            self.place(task, slot, week, room)
+
+    def improve(self, iterations):
+        temperature = 1.0
+        conflicted = []
+        for iteration in range(iterations):
+            if iteration % 100 == 0 or not conflicted:
+                conflicted = [i for i in self.tasks if self.clashes(i)]
+                if not conflicted:
+                    break
+            task = self.random.choice(conflicted)
+            old = (task.slot, task.week, task.room)
+            old_cost = self.clashes(task)
+            self.remove(task)
+            if self.random.random() < 0.1:
+                cost, order, slot, week = self.random.choice(self.options(task))
+                room, room_cost = self.find_room(slot, week, task.room)
+                new = (cost + room_cost, slot, week, room)
+            else:
+                new = self.best_placement(task)
+            delta = new[0] - old_cost
+            t = temperature * (1 - iteration / iterations)
+            if delta <= 0 or (t > 0 and self.random.random() < math.exp(-delta / t)):
+                self.place(task, *new[1:])
+            else:
+                self.place(task, *old)
+
+    def solve(self, iterations=SOLVER_ITERATIONS):
+        placed = [i for i in self.tasks if i.slot is not None]
+        for task in placed:
+            self.add(task)
+        self.repair_rooms()
+        self.tasks = [i for i in self.tasks if i.slot is None]
+        self.construct()
+        self.tasks += placed
+        self.improve(iterations)
+        return self.tasks
+
+    def conflicts(self):
+        return sum(1 for i in self.tasks if self.clashes(i))
+
+    def drop_clashing(self):
+        """
+        Take clashing tasks out of their classroom, or out of the timetable
+        when that is not enough, and return the tasks left clash free.
+        """
+        kept = []
+        for task in self.tasks:
+            if self.clashes(task) and task.room is not None:
+                self.remove(task)
+                task.room = None
+                self.add(task)
+            if self.clashes(task):
+                self.remove(task)
+            else:
+                kept.append(task)
+        return kept
+
+
+def components(tasks):
+    """Split tasks into lists sharing no teacher or students."""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for task in tasks:
+        for i in task.resources[1:]:
+            parent[find(i)] = find(task.resources[0])
+    parts = defaultdict(list)
+    for k, task in enumerate(tasks):
+        parts[find(task.resources[0]) if task.resources else k].append(task)
+    return list(parts.values())
+
+
+_shared = {}
+
+
+def _init_part(fixed, rooms):
+    _shared['fixed'], _shared['rooms'] = fixed, rooms
+
+
+def _solve_part(args):
+    tasks, seed, iterations = args
+    Solver(tasks, _shared['fixed'], _shared['rooms'], seed).solve(iterations)
+    return [(i.slot, i.week, i.room) for i in tasks]
+
+
+def solve(tasks, fixed=(), rooms=(), seed=None, iterations=SOLVER_ITERATIONS,
+          workers=1):
+    """
+    Place tasks, solving components apart, in ``workers`` processes when
+    there are more than one, then repairing clashes of classrooms and of
+    the whole problem in this process. Component ``k`` gets ``seed + k``,
+    so results depend on the seed but not on the number of workers.
+    """
+    tasks = list(tasks)
+    parts = components(tasks)
+    args = [
+        (part, None if seed is None else seed + k, iterations)
+        for k, part in enumerate(parts)
+    ]
+    if workers > 1:
+        with ProcessPoolExecutor(
+                workers, initializer=_init_part, initargs=(fixed, rooms)) as pool:
+            chunksize = max(1, len(args) // (4 * workers))
+            results = list(pool.map(_solve_part, args, chunksize=chunksize))
+    else:
+        _init_part(fixed, rooms)
+        results = [_solve_part(i) for i in args]
+        _shared.clear()
+    for part, placements in zip(parts, results):
+        for task, (slot, week, room) in zip(part, placements):
+            task.slot, task.week, task.room = slot, week, room
+    solver = Solver(tasks, fixed, rooms, seed)
+    solver.solve(iterations)
+    return solver
+
+
+def lesson_units(amount):
+    """Return recordings of a two-week cycle, one unit per week."""
+    return math.ceil(2 * amount / SEMESTER_WEEKS)
+
+
+def load_problem(lessons, replace=False):
+    """
+    Build Tasks for lessons: each lesson gets as many week units as its
+    CurriculumRecording amount spread over SEMESTER_WEEKS (two units, one
+    lesson every week, without a curriculum record), minus the recordings
+    it already has. Recordings of other lessons overlapping their
+    curriculum periods become fixed Tasks.
+    """
+    lessons = list(lessons.select_related('subgroup__group'))
+    lesson_pks = [i.pk for i in lessons]
+    hierarchy = SubGroupHierarchy.load({i.subgroup_id for i in lessons})
+    union_groups = {
+        stream: group
+        for stream, groups in hierarchy.stream_groups.items()
+        for group, number in groups.items() if number == 0
+    }
+    semesters = {i.semester for i in lessons}
+
+    amounts = {}
+    records = CurriculumRecording.objects.filter(
+        group__group_stream__in=hierarchy.stream_groups,
+        semester__in=semesters,
+    ).prefetch_related('subjects')
+    for record in records:
+        for subject in record.subjects.all():
+            amounts[record.group_id, record.semester, subject.pk] = record
+
+    existing = defaultdict(int)
+    if not replace:
+        rows = TimeTableRecording.objects.filter(
+            lesson__in=lesson_pks,
+        ).values_list('lesson', 'lesson_number').order_by()
+        for lesson, number in rows:
+            existing[lesson] += len(WEEK_BITS.get(number.week, ()))
+
+    tasks = []
+    for lesson in lessons:
+        subgroup = hierarchy.subgroups[lesson.subgroup_id]
+        record = amounts.get((subgroup.group, lesson.semester, lesson.subject_id))
+        if record is None:
+            union = union_groups.get(subgroup.group_stream)
+            record = amounts.get((union, lesson.semester, lesson.subject_id))
+        units = 2
+        if record is not None:
+            units = lesson_units(getattr(record, LESSON_AMOUNTS[lesson.lesson]))
+        units -= existing[lesson.pk]
+        resources = tuple(('s',) + i for i in hierarchy.atoms(lesson.subgroup_id))
+        if lesson.teacher_id:
+            resources += (('t', lesson.teacher_id),)
+        while units > 0:
+            tasks.append(Task(lesson.pk, units > 1, resources))
+            units -= 2
+
+    periods = Curriculum.objects.filter(
+        group_stream__in=hierarchy.stream_groups, semester__in=semesters,
+    ).values_list('start_date', 'end_date')
+    starts = [i[0] for i in periods if i[0]]
+    ends = [i[1] for i in periods if i[1]]
+    fixed_query = with_periods(TimeTableRecording.objects.all())
+    if starts and ends:
+        fixed_query = fixed_query.filter(
+            Q(period_start__isnull=True) | Q(period_start__lte=max(ends)),
+            Q(period_end__isnull=True) | Q(period_end__gte=min(starts)),
+        )
+    else:
+        fixed_query = fixed_query.filter(lesson__semester__in=semesters)
+    if replace:
+        fixed_query = fixed_query.exclude(lesson__in=lesson_pks)
+    rows = fixed_query.values_list(
+        'lesson', 'lesson_number', 'teacher', 'lesson__teacher', 'classroom',
+        'lesson__subgroup',
+    ).order_by()
+    slot_index = {v: k for k, v in enumerate(SLOTS)}
+    fixed = []
+    for lesson, number, teacher, lesson_teacher, room, subgroup in rows:
+        slot = slot_index.get((number.day, number.lesson))
+        if slot is None or number.week not in WEEK_BITS:
+            continue
+        resources = ()
+        if subgroup in hierarchy.subgroups:
+            resources = tuple(('s',) + i for i in hierarchy.atoms(subgroup))
+        if teacher or lesson_teacher:
+            resources += (('t', teacher or lesson_teacher),)
+        room = ('r', room) if room else None
+        fixed.append(Task(lesson, number.week == BOTH, resources, slot, number.week, room))
+
+    rooms = list(Classroom.objects.values_list('pk', flat=True).order_by('pk'))
+    return Problem(tasks, fixed, rooms, lesson_pks)
+
+
+def save_tasks(tasks, lessons, replace=False):
+    """Write placed tasks of lessons as recordings, replacing old ones."""
+    with transaction.atomic():
+        taken = set()
+        affected = set()
+        if replace:
+            # Teachers of deleted recordings show them too.
+            affected = recording_timetables(lesson__in=lessons)
+            TimeTableRecording.objects.filter(lesson__in=lessons).delete()
+        else:
+            taken = set(TimeTableRecording.objects.filter(
+                lesson__in=lessons,
+            ).values_list('lesson', 'lesson_number').order_by())
+        recordings = []
+        for task in tasks:
+            day, lesson = SLOTS[task.slot]
+            number = LessonNumber((task.week, day, lesson))
+            if (task.lesson, number) in taken:
+                continue
+            taken.add((task.lesson, number))
+            recordings.append(TimeTableRecording(
+                lesson_id=task.lesson, lesson_number=number,
+                classroom_id=task.room[1] if task.room else None,
+            ))
+        TimeTableRecording.objects.bulk_create(recordings)
+        affected |= recording_timetables(lesson__in=lessons)
+        refresh_timetables(affected)
+    return recordings
+
+
+def generate_timetable(lessons, replace=False, iterations=SOLVER_ITERATIONS,
+                       seed=None, workers=1):
+    """
+    Place recordings of a Lesson queryset, keeping recordings they already
+    have unless ``replace`` is set. Recordings still clashing are saved
+    without their classroom when that settles the clash and are left out
+    otherwise. Return created recordings and the number of unplaced ones.
+    """
+    problem = load_problem(lessons, replace)
+    solver = solve(
+        problem.tasks, problem.fixed, problem.rooms, seed, iterations, workers)
+    placed = solver.drop_clashing()
+    recordings = save_tasks(placed, problem.lessons, replace)
+    return recordings, len(solver.tasks) - len(placed)
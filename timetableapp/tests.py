@@ -1,3 +1,982 @@
-from django.test import TestCase
+from datetime import date
+from importlib import import_module
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib import admin
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.forms import inlineformset_factory
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from django_improvements.forms import ReadOnlyOnExistInlineFormSet
+from django_improvements.models import readonly_errors
+from lesson_field.functions import SlotValue
+from lesson_field.helpers import Lesson as LessonNumber, decode
+from lesson_field.settings import LESSONS_RANGE, WORK_DAYS
+from yearlessdate.helpers import YearlessDate, YearlessDateRange
+
+from timetableapp.benchmarks import compare
+from timetableapp.cache import TEACHER, get_cache
+from timetableapp.conflicts import (
+    SubGroupHierarchy, find_double_bookings, find_recording_conflicts,
+)
+from timetableapp.fake import SIZES, generate_university
+from timetableapp.forms import (
+    CurriculumForm, CurriculumFormset, FormOfStudySemesterFormset,
+    TimeTableRecordingForm, TimeTableRecordingFormset,
+)
+from timetableapp.intervals import (
+    overlapping_pairs, yearless_intervals, yearless_overlapping_pairs,
+)
+from timetableapp.layout import Placement, layout, layout_many
+from timetableapp.models import (
+    Building, Classroom, Curriculum, CurriculumRecording, Department, Faculty,
+    FormOfStudy, FormOfStudySemester, Group, GroupStream, Lesson, Person,
+    Specialty, Subject, SubGroup, SubGroupConflict, Teacher,
+    TimeTableRecording, TimeTableStamp,
+)
+from timetableapp.rollover import rollover
+from timetableapp.solver import SLOTS, Task, generate_timetable, save_tasks, solve
+from timetableapp.views import build_teacher_timetable
+
+
+def create_university(faculties=3, specialties=2, years=(2019, 2020), groups=3):
+    """
+    Seed a small but complete university: every faculty has departments,
+    subjects, teachers and specialties with group streams of every year,
+    groups split into halves, curriculum records, lessons and recordings.
+    """
+    form = FormOfStudy.objects.create(name='full-time', suffix='', semesters=8)
+    FormOfStudySemester.objects.create(form=form, date_range=YearlessDateRange(
+        YearlessDate(9, 1), YearlessDate(12, 31)))
+    FormOfStudySemester.objects.create(form=form, date_range=YearlessDateRange(
+        YearlessDate(2, 1), YearlessDate(6, 30)))
+    building = Building.objects.create(number=1, address='Main street')
+    classrooms = [
+        Classroom.objects.create(building=building, number=100 + i)
+        for i in range(12)
+    ]
+    slot = 0
+    for f in range(faculties):
+        faculty = Faculty.objects.create(name='Faculty %s' % f, abbreviation='F%s' % f)
+        department = Department.objects.create(
+            faculty=faculty, name='Department %s' % f, abbreviation='D%s' % f)
+        subjects = [
+            Subject.objects.create(name='Subject %s-%s' % (f, i), department=department)
+            for i in range(3)
+        ]
+        teachers = [
+            Teacher.objects.create(department=department, person=Person.objects.create(
+                first_name='Name', middle_name='Middle', last_name='Teacher %s-%s' % (f, i)))
+            for i in range(3)
+        ]
+        for s in range(specialties):
+            specialty = Specialty.objects.create(
+                faculty=faculty, name='Specialty %s-%s' % (f, s),
+                number=f * 10 + s, abbreviation='S%s%s' % (f, s))
+            for year in years:
+                stream = GroupStream.objects.create(specialty=specialty, year=year, form=form)
+                union = stream.get_union_group().get_union_subgroup()
+                for k, subject in enumerate(subjects):
+                    lesson = Lesson.objects.create(
+                        subgroup=union, semester=1, subject=subject, lesson=0,
+                        teacher=teachers[k])
+                    TimeTableRecording.objects.create(
+                        lesson=lesson, classroom=classrooms[slot % len(classrooms)],
+                        lesson_number=LessonNumber((3, k % 6, 1 + slot % 5)))
+                    slot += 1
+                for number in range(1, groups + 1):
+                    group = Group.objects.create(group_stream=stream, number=number)
+                    record = CurriculumRecording.objects.create(
+                        group=group, semester=1, lectures=16, practices=16,
+                        laboratory=8, independent_work=32)
+                    record.subjects.set(subjects)
+                    for half in (1, 2):
+                        subgroup = SubGroup.objects.create(
+                            group=group, numerator=half, denominator=2)
+                        lesson = Lesson.objects.create(
+                            subgroup=subgroup, semester=1, subject=subjects[half],
+                            lesson=2, teacher=teachers[half])
+                        TimeTableRecording.objects.create(
+                            lesson=lesson, classroom=classrooms[slot % len(classrooms)],
+                            lesson_number=LessonNumber((half, number % 6, 1 + slot % 5)))
+                        slot += 1
+
+
+def table_width(data):
+    """
+    Return the number of columns of laid out rows, failing when cells
+    overlap or rows differ in width.
+    """
+    taken = set()
+    widths = set()
+    for row, cells in enumerate(data):
+        column = 0
+        for rowspan, colspan, text, width in cells:
+            while (row, column) in taken:
+                column += 1
+            for i in range(row, row + rowspan):
+                for j in range(column, column + colspan):
+                    assert (i, j) not in taken, (i, j, text)
+                    taken.add((i, j))
+            column += colspan
+        widths.add(max([j + 1 for i, j in taken if i == row] or [0]))
+    assert len(widths) == 1, widths
+    assert len(taken) == len(data) * widths.pop()
+    return max(j for i, j in taken) + 1
+
+
+class LayoutTest(SimpleTestCase):
+    def test_empty(self):
+        self.assertEqual(table_width(layout([], [])), 4)
+
+    def test_mixed_denominators(self):
+        columns = [('1', 2), ('2', 3)]
+        placements = [
+            Placement(0, 2, 2, 1, 1, 1, 'a'),
+            Placement(1, 3, 3, 1, 1, 1, 'b'),
+            Placement(1, 1, 3, 2, 1, 1, 'c'),
+            Placement(0, 0, 0, 2, 1, 1, 'd'),
+            Placement(None, 0, 0, 3, 1, 2, 'e'),
+        ]
+        data = layout(columns, placements)
+        self.assertEqual(table_width(data), 3 + 2 * 6)
+        texts = [i[2] for row in data for i in row]
+        for i in 'abcde':
+            self.assertEqual(texts.count(i), 1)
+
+    def test_both_weeks(self):
+        columns = [('1', 2), ('2', 1)]
+        placements = [
+            Placement(0, 1, 2, 3, 2, 3, 'a'),
+            Placement(0, 2, 2, 1, 2, 3, 'b'),
+            Placement(1, 0, 0, 2, 2, 3, 'c'),
+            Placement(1, 0, 0, 3, 3, 1, 'd'),
+        ]
+        data = layout(columns, placements)
+        self.assertEqual(table_width(data), 3 + 2 * 2)
+        cells = {i[2]: i for row in data for i in row}
+        self.assertEqual(cells['a'][:2], (2, 1))
+        self.assertEqual(cells['d'][:2], (2, 2))
+
+    def test_layout_many(self):
+        items = [
+            ('empty', ([], [])),
+            ('one', ([('1', 2)], [Placement(0, 1, 2, 1, 1, 1, 'a')])),
+        ]
+        result = layout_many(iter(items))
+        self.assertFalse(isinstance(result, (list, dict)))
+        key, data = next(result)
+        self.assertEqual((key, data), ('empty', layout([], [])))
+        self.assertEqual(list(result), [('one', layout(*items[1][1]))])
+
+
+# Largest number of queries a page may take. Counts must also stay the same
+# whatever the number of rows on the page.
+CHANGELIST_BUDGET = 10
+CHANGE_FORM_BUDGET = 20
+AUTOCOMPLETE_BUDGET = 5
+TIMETABLE_BUDGET = 3
+CACHED_TIMETABLE_BUDGET = 1
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university()
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        get_cache().clear()
+        self.client.force_login(self.user)
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def model_admins(self):
+        for model, model_admin in admin.site._registry.items():
+            if model._meta.app_label == 'timetableapp':
+                yield model, model_admin
+
+    def admin_url(self, model, view, *args):
+        opts = model._meta
+        return reverse(
+            'admin:%s_%s_%s' % (opts.app_label, opts.model_name, view), args=args)
+
+    def test_changelists(self):
+        for model, model_admin in self.model_admins():
+            with self.subTest(model=model.__name__):
+                url = self.admin_url(model, 'changelist')
+                counts = []
+                for per_page in (2, 50):
+                    with mock.patch.object(model_admin, 'list_per_page', per_page):
+                        counts.append(self.count_queries(url))
+                self.assertEqual(counts[0], counts[1])
+                self.assertLessEqual(counts[1], CHANGELIST_BUDGET)
+
+    def test_change_forms(self):
+        for model, model_admin in self.model_admins():
+            with self.subTest(model=model.__name__):
+                obj = model.objects.order_by('-pk').first()
+                url = self.admin_url(model, 'change', obj.pk)
+                self.assertLessEqual(self.count_queries(url), CHANGE_FORM_BUDGET)
+
+    def test_autocomplete(self):
+        for model, model_admin in self.model_admins():
+            if not model_admin.search_fields:
+                continue
+            with self.subTest(model=model.__name__):
+                url = self.admin_url(model, 'autocomplete')
+                counts = []
+                for per_page in (2, 50):
+                    with mock.patch.object(AutocompleteJsonView, 'paginate_by', per_page):
+                        counts.append(self.count_queries(url, term=''))
+                self.assertEqual(counts[0], counts[1])
+                self.assertLessEqual(counts[1], AUTOCOMPLETE_BUDGET)
+
+    def test_current_datetime(self):
+        # A lone union group stream against one with groups and subgroups.
+        small = GroupStream.objects.create(
+            specialty=Specialty.objects.first(), year=2021,
+            form=FormOfStudy.objects.first())
+        large = GroupStream.objects.order_by('-pk')[1]
+        counts = []
+        for stream in (small, large):
+            url = '/timetableapp/timetable/%s/1' % stream.pk
+            counts.append(self.count_queries(url))
+            self.assertLessEqual(self.count_queries(url), CACHED_TIMETABLE_BUDGET)
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[1], TIMETABLE_BUDGET)
+
+
+class LessonNumberLookupsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, groups=3)
+        cls.numbers = dict(TimeTableRecording.objects.values_list(
+            'pk', 'lesson_number'))
+
+    def filtered(self, **lookup):
+        return set(TimeTableRecording.objects.filter(
+            **lookup).values_list('pk', flat=True))
+
+    def expected(self, test):
+        return {k for k, v in self.numbers.items() if test(v)}
+
+    def test_parts(self):
+        for part, values in (
+                ('week', range(4)), ('day', WORK_DAYS), ('lesson', LESSONS_RANGE)):
+            for value in values:
+                with self.subTest(part=part, value=value):
+                    self.assertEqual(
+                        self.filtered(**{'lesson_number__' + part: value}),
+                        self.expected(lambda i: getattr(i, part) == value))
+        self.assertEqual(
+            self.filtered(lesson_number__week__in=[1, 2]),
+            self.expected(lambda i: i.week in (1, 2)))
+
+    def test_week_overlaps(self):
+        for week in (1, 2, 3):
+            with self.subTest(week=week):
+                expected = self.expected(lambda i: i.week & week)
+                self.assertTrue(expected)
+                self.assertEqual(
+                    self.filtered(lesson_number__week_overlaps=week), expected)
+                self.assertEqual(self.filtered(
+                    lesson_number__week_overlaps=LessonNumber((week, 0, 1)),
+                ), expected)
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite query plan")
+    def test_query_plan(self):
+        for part, index in (
+                ('day', 'timetableapp_ttr_day_idx'),
+                ('week', 'timetableapp_ttr_week_idx')):
+            with self.subTest(part=part):
+                query = TimeTableRecording.objects.filter(**{
+                    'lesson_number__' + part: 1}).values('pk').order_by().query
+                sql, params = query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    plan = ' '.join(str(i) for i in cursor.fetchall())
+                self.assertIn(index, plan)
+
+
+class TimetableCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, years=(2020,), groups=2)
+        cls.stream = GroupStream.objects.get()
+        cls.url = '/timetableapp/timetable/%s/1' % cls.stream.pk
+
+    def setUp(self):
+        get_cache().clear()
+
+    def change_elsewhere(self, classroom):
+        # Bulk updates send no signals, like a change made by another
+        # process, whose cache version bumps never reach this one.
+        TimeTableRecording.objects.filter(
+            lesson__subgroup__group__group_stream=self.stream,
+        ).update(classroom=classroom)
+        TimeTableStamp.touch(self.stream.pk, 1)
+
+    def test_stamp_change_refreshes_cached_body(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        classroom = Classroom.objects.create(
+            building=Building.objects.get(), number=999)
+        self.change_elsewhere(classroom)
+        self.assertContains(self.client.get(self.url), str(classroom))
+
+    def test_etag_matches_body(self):
+        etag = self.client.get(self.url)['ETag']
+        classroom = Classroom.objects.create(
+            building=Building.objects.get(), number=999)
+        self.change_elsewhere(classroom)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, str(classroom))
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class TeacherTimetableTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, groups=1)
+        cls.teacher = Teacher.objects.order_by('pk').first()
+        lessons = Lesson.objects.filter(
+            teacher=cls.teacher, subgroup__group__number=0)
+        slots = {2019: (1, 1, 1), 2020: (3, 1, 1)}
+        for lesson in lessons:
+            year = lesson.subgroup.group.group_stream.year
+            lesson.timetablerecording_set.update(
+                lesson_number=LessonNumber(slots[year]))
+        # A numerator lesson next to a both week one at the same time.
+        recording = TimeTableRecording.objects.filter(
+            lesson__subgroup__group__group_stream__year=2020,
+            lesson__subgroup__denominator=2,
+        ).first()
+        recording.lesson_number = LessonNumber((1, 1, 1))
+        recording.teacher = cls.teacher
+        recording.save()
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_period(self):
+        for year, other in ((2019, 2020), (2020, 2019)):
+            with self.subTest(year=year):
+                url = '/timetableapp/timetable/teacher/%s' % self.teacher.pk
+                response = self.client.get(url, {'date': '%s-10-01' % year})
+                self.assertContains(response, 'S00-%s' % (year % 100))
+                self.assertNotContains(response, 'S00-%s' % (other % 100))
+
+    def test_rectangular(self):
+        for day in (date(2019, 10, 1), date(2020, 10, 1), date(2021, 10, 1)):
+            with self.subTest(day=day):
+                table_width(build_teacher_timetable(self.teacher.pk, day))
+        # Both week and numerator lessons are merged into one both week cell.
+        data = build_teacher_timetable(self.teacher.pk, date(2020, 10, 1))
+        cells = [i for row in data for i in row if '; ' in str(i[2])]
+        self.assertEqual([i[0] for i in cells], [2])
+
+    def test_curriculum_change(self):
+        url = '/timetableapp/timetable/teacher/%s' % self.teacher.pk
+        self.assertContains(self.client.get(url, {'date': '2020-10-01'}), 'S00-20')
+        curriculum = Curriculum.objects.get(group_stream__year=2020, semester=1)
+        curriculum.start_date = date(2020, 11, 1)
+        curriculum.save()
+        self.assertNotContains(self.client.get(url, {'date': '2020-10-01'}), 'S00-20')
+
+    def test_bad_date(self):
+        url = '/timetableapp/timetable/teacher/%s' % self.teacher.pk
+        response = self.client.get(url, {'date': '2020-02-30'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ClassroomOccupancyTest(TestCase):
+    url = '/timetableapp/timetable/classrooms/free'
+
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, groups=1)
+        cls.recording = TimeTableRecording.objects.filter(
+            lesson__subgroup__group__group_stream__year=2020,
+        ).select_related('classroom').first()
+        cls.slot = cls.recording.lesson_number
+
+    def setUp(self):
+        get_cache().clear()
+
+    def free(self, day, week=None):
+        response = self.client.get(self.url, {
+            'date': day, 'week': self.slot.week if week is None else week,
+            'day': self.slot.day, 'lesson': self.slot.lesson,
+        })
+        self.assertEqual(response.status_code, 200)
+        return {i['id'] for i in response.json()['classrooms']}
+
+    def test_period(self):
+        self.assertNotIn(self.recording.classroom_id, self.free('2020-10-01'))
+        self.assertIn(self.recording.classroom_id, self.free('2021-10-01'))
+        self.assertIn(self.recording.classroom_id, self.free('2020-07-01'))
+        response = self.client.get(
+            '/timetableapp/timetable/classrooms', {'date': '2020-10-01'})
+        self.assertContains(response, str(self.recording.classroom))
+
+    def test_curriculum_change(self):
+        self.assertNotIn(self.recording.classroom_id, self.free('2020-10-01'))
+        curriculum = Curriculum.objects.get(group_stream__year=2020, semester=1)
+        curriculum.start_date = date(2020, 11, 1)
+        curriculum.save()
+        self.assertIn(self.recording.classroom_id, self.free('2020-10-01'))
+
+    def test_slot_values(self):
+        rows = TimeTableRecording.objects.values_list(
+            'lesson_number', SlotValue('lesson_number')).order_by()
+        numbers = [i[0] for i in rows]
+        self.assertTrue(all(type(i[1]) is int for i in rows))
+        expected = (
+            [i.week for i in numbers], [i.day for i in numbers],
+            [i.lesson for i in numbers],
+        )
+        for values in (
+                TimeTableRecording.objects.values_list(SlotValue('lesson_number')),
+                TimeTableRecording.objects.values_list('lesson_number'),
+                TimeTableRecording.objects.values_list('lesson_number', flat=True)):
+            self.assertEqual(decode(values.order_by()), expected)
+
+    def test_bad_week(self):
+        for week in (0, 4, ''):
+            with self.subTest(week=week):
+                response = self.client.get(self.url, {
+                    'week': week, 'day': self.slot.day,
+                    'lesson': self.slot.lesson,
+                })
+                self.assertEqual(response.status_code, 400)
+
+
+class RecordingConflictsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, groups=2)
+        cls.stream = GroupStream.objects.get(year=2020)
+        cls.subjects = list(Subject.objects.order_by('pk'))
+        group1, group2 = cls.stream.group_set.filter(number__gt=0).order_by('number')
+        for numerator in (1, 2, 3):
+            SubGroup.objects.create(group=group2, numerator=numerator, denominator=3)
+        # Lessons sharing subject and kind with lessons of their halves.
+        cls.group_lesson = cls.lesson(group1.get_union_subgroup(), 1, 2)
+        cls.stream_lesson = cls.lesson(
+            cls.stream.get_union_group().get_union_subgroup(), 2, 2)
+        for k, lesson in enumerate((cls.group_lesson, cls.stream_lesson)):
+            TimeTableRecording.objects.create(
+                lesson=lesson, lesson_number=LessonNumber((3, 5, 1 + k)))
+        # Conflicting lessons without recordings.
+        cls.batch_lessons = (
+            cls.lesson(group2.get_union_subgroup(), 0, 1),
+            cls.lesson(group2.subgroup_set.get(numerator=1, denominator=3), 0, 1),
+        )
+
+    @classmethod
+    def lesson(cls, subgroup, subject, kind):
+        return Lesson.objects.create(
+            subgroup=subgroup, semester=1, subject=cls.subjects[subject],
+            lesson=kind)
+
+    def test_conflict_subgroups(self):
+        hierarchy = SubGroupHierarchy.load_streams(
+            GroupStream.objects.values('pk'))
+        for subgroup in SubGroup.objects.all():
+            with self.subTest(subgroup=str(subgroup)):
+                expected = set(subgroup.get_conflict_subgroups().values_list(
+                    'pk', flat=True))
+                self.assertEqual(hierarchy.conflict_subgroups(subgroup.pk), expected)
+                self.assertEqual(set(SubGroupConflict.objects.filter(
+                    subgroup=subgroup).values_list('other', flat=True)), expected)
+
+    def test_migration(self):
+        migration = import_module('timetableapp.migrations.0008_subgroupconflict')
+        expected = set(SubGroupConflict.objects.values_list('subgroup', 'other'))
+        SubGroupConflict.objects.all().delete()
+        migration.create_conflicts(django_apps, None)
+        self.assertEqual(
+            set(SubGroupConflict.objects.values_list('subgroup', 'other')), expected)
+
+    def test_validate_unique(self):
+        # Result of TimeTableRecording.validate_unique before the batch check.
+        for recording in TimeTableRecording.objects.select_related('lesson__subgroup'):
+            lesson = recording.lesson
+            expected = set(TimeTableRecording.objects.filter(
+                lesson__in=Lesson.objects.exclude(pk=lesson.pk).filter(
+                    subgroup__in=lesson.subgroup.get_conflict_subgroups(),
+                    semester=lesson.semester, subject=lesson.subject,
+                    lesson=lesson.lesson,
+                ),
+            ).exclude(pk=recording.pk).values_list('pk', flat=True))
+            with self.subTest(recording=str(recording)):
+                conflicts = find_recording_conflicts([recording])
+                self.assertEqual({i.other.pk for i in conflicts}, expected)
+        self.assertTrue(find_recording_conflicts(
+            TimeTableRecording.objects.filter(lesson=self.group_lesson)))
+
+    def test_batch(self):
+        recordings = [
+            TimeTableRecording(lesson=i, lesson_number=LessonNumber((3, 5, 5)))
+            for i in self.batch_lessons
+        ]
+        self.assertEqual(find_recording_conflicts(recordings[:1]), [])
+        conflicts = find_recording_conflicts(recordings)
+        self.assertEqual(
+            {(id(i.recording), id(i.other)) for i in conflicts},
+            {(id(recordings[0]), id(recordings[1])),
+             (id(recordings[1]), id(recordings[0]))},
+        )
+
+    def formset(self, lesson, *forms):
+        data = {
+            'timetablerecording_set-TOTAL_FORMS': len(forms),
+            'timetablerecording_set-INITIAL_FORMS': 0,
+        }
+        for k, (slot, classroom) in enumerate(forms):
+            prefix = 'timetablerecording_set-%s-' % k
+            for j, value in enumerate(slot):
+                data['%slesson_number_%s' % (prefix, j)] = value
+            data[prefix + 'classroom'] = classroom.pk if classroom else ''
+        formset = inlineformset_factory(
+            Lesson, TimeTableRecording, form=TimeTableRecordingForm,
+            formset=TimeTableRecordingFormset, extra=0,
+            fields=('lesson_number', 'classroom'),
+        )(data, instance=lesson)
+        self.assertFalse(formset.is_valid())
+        return [i.non_field_errors() for i in formset.forms]
+
+    def test_formset_conflicts(self):
+        saved = TimeTableRecording.objects.get(
+            lesson__subgroup__group=self.group_lesson.subgroup.group_id,
+            lesson__subgroup__numerator=1,
+        )
+        lesson = Lesson.objects.get(pk=self.group_lesson.pk)
+        errors = self.formset(lesson, ((3, 4, 1), None))
+        self.assertEqual(errors, [["Duplicate time table recording by %s." % saved]])
+
+    def test_formset_double_bookings(self):
+        taken = TimeTableRecording.objects.filter(
+            classroom__isnull=False,
+            lesson__subgroup__group__group_stream=self.stream,
+        ).first()
+        slot = taken.lesson_number
+        errors = self.formset(
+            self.batch_lessons[0],
+            ((1, 4, 5), taken.classroom),
+            ((slot.week, slot.day, slot.lesson), taken.classroom),
+        )
+        self.assertEqual(errors[0], [])
+        self.assertEqual(len(errors[1]), 1)
+        self.assertIn(str(taken), errors[1][0])
+
+
+class IntervalsTest(SimpleTestCase):
+    def test_overlapping_pairs(self):
+        intervals = [('a', 1, 5), ('b', 5, 9), ('c', 10, 12), ('d', 2, 3)]
+        self.assertEqual(
+            overlapping_pairs(intervals), [('a', 'b'), ('a', 'd')])
+        # Pieces of one key never pair with each other.
+        self.assertEqual(overlapping_pairs([('a', 1, 5), ('a', 3, 7)]), [])
+
+    def test_wrap_over_new_year(self):
+        winter = YearlessDateRange(YearlessDate(11, 1), YearlessDate(2, 15))
+        self.assertEqual(yearless_intervals(0, winter), [
+            (0, YearlessDate(11, 1).value, YearlessDate(12, 31).value),
+            (0, YearlessDate(1, 1).value, YearlessDate(2, 15).value),
+        ])
+        ranges = [
+            (0, winter),
+            (1, YearlessDateRange(YearlessDate(2, 15), YearlessDate(6, 30))),
+            (2, YearlessDateRange(YearlessDate(7, 1), YearlessDate(10, 31))),
+            (3, YearlessDateRange(YearlessDate(12, 1), YearlessDate(12, 2))),
+        ]
+        self.assertEqual(yearless_overlapping_pairs(ranges), [(0, 1), (0, 3)])
+
+    def test_touching_on_one_day(self):
+        ranges = [
+            (0, YearlessDateRange(YearlessDate(9, 1), YearlessDate(12, 31))),
+            (1, YearlessDateRange(YearlessDate(12, 31), YearlessDate(1, 15))),
+            (2, YearlessDateRange(YearlessDate(1, 16), YearlessDate(6, 30))),
+        ]
+        self.assertEqual(yearless_overlapping_pairs(ranges), [(0, 1)])
+
+
+class DateRangeFormsetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.form = FormOfStudy.objects.create(name='full-time', suffix='', semesters=4)
+        faculty = Faculty.objects.create(name='Faculty', abbreviation='F')
+        specialty = Specialty.objects.create(
+            faculty=faculty, name='Specialty', number=1, abbreviation='S')
+        cls.stream = GroupStream.objects.create(
+            specialty=specialty, year=2019, form=cls.form)
+
+    def semesters_formset(self, *forms, semesters=4):
+        prefix = 'formofstudysemester_set'
+        data = {
+            'semesters': semesters,
+            prefix + '-TOTAL_FORMS': len(forms),
+            prefix + '-INITIAL_FORMS': 0,
+        }
+        for k, (values, delete) in enumerate(forms):
+            for j, value in enumerate(values):
+                data['%s-%s-date_range_%s' % (prefix, k, j)] = value
+            if delete:
+                data['%s-%s-DELETE' % (prefix, k)] = 'on'
+        return inlineformset_factory(
+            FormOfStudy, FormOfStudySemester, fields=('date_range',),
+            formset=FormOfStudySemesterFormset, extra=0,
+        )(data, instance=self.form)
+
+    def curriculum_formset(self, *forms):
+        prefix = 'curriculum_set'
+        data = {
+            prefix + '-TOTAL_FORMS': len(forms),
+            prefix + '-INITIAL_FORMS': 0,
+        }
+        for k, (semester, start, end, delete) in enumerate(forms):
+            data['%s-%s-semester' % (prefix, k)] = semester
+            data['%s-%s-start_date' % (prefix, k)] = start
+            data['%s-%s-end_date' % (prefix, k)] = end
+            if delete:
+                data['%s-%s-DELETE' % (prefix, k)] = 'on'
+        return inlineformset_factory(
+            GroupStream, Curriculum, form=CurriculumForm,
+            formset=CurriculumFormset, extra=0,
+        )(data, instance=self.stream)
+
+    def test_semesters_errors(self):
+        formset = self.semesters_formset(
+            ((9, 1, 12, 31), False),
+            ((12, 31, 1, 15), False),
+            ((1, 16, 6, 30), False),
+            ((6, 1, 8, 31), False),
+        )
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(
+            [i.non_field_errors() for i in formset.forms], [
+                [], ["Date range overlaps with date range 1."],
+                [], ["Date range overlaps with date range 3."],
+            ])
+        self.assertEqual(formset.non_form_errors(), ["Date ranges are overlapping."])
+
+    def test_semesters_deleted(self):
+        formset = self.semesters_formset(
+            ((9, 1, 1, 31), False),
+            ((12, 1, 6, 30), True),
+            ((2, 1, 6, 30), False),
+            ((7, 1, 8, 31), True),
+            semesters=2,
+        )
+        self.assertTrue(formset.is_valid(), formset.non_form_errors())
+
+    def test_curriculum_errors(self):
+        formset = self.curriculum_formset(
+            (11, '2019-09-01', '2019-12-31', False),
+            (12, '2019-12-31', '2020-06-30', False),
+            (13, '2020-07-01', '2020-12-31', False),
+            (14, '2020-12-01', '2021-06-30', True),
+        )
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(
+            [i.non_field_errors() for i in formset.forms], [
+                [], ["Dates of semesters 11 and 12 are overlapping."], [], [],
+            ])
+        self.assertEqual(formset.non_form_errors(), ["Date ranges are overlapping."])
+
+    def test_curriculum_blank_semester(self):
+        formset = self.curriculum_formset(
+            (11, '2019-09-01', '2019-12-31', False),
+            ('', '2019-12-01', '2020-06-30', False),
+        )
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(
+            formset.forms[1].non_field_errors(),
+            ["Dates of semesters 11 and 2 are overlapping."])
+        self.assertIn('semester', formset.forms[1].errors)
+
+
+class SolveTest(SimpleTestCase):
+    def tasks(self):
+        # Three teachers, each with lessons of their own two groups.
+        return [
+            Task(k, k % 4 == 0, (('t', k % 3), ('s', k % 3, k % 2)))
+            for k in range(48)
+        ]
+
+    def test_workers(self):
+        placements = []
+        for workers in (1, 2):
+            solver = solve(self.tasks(), rooms=range(3), seed=1,
+                           iterations=200, workers=workers)
+            placements.append([(i.slot, i.week, i.room) for i in solver.tasks])
+        self.assertEqual(placements[0], placements[1])
+
+
+class GenerateTimetableTest(TestCase):
+    def test_more_tasks_than_slots(self):
+        create_university(faculties=1, specialties=1, years=(2020,), groups=1)
+        stream = GroupStream.objects.get()
+        union = stream.get_union_group().get_union_subgroup()
+        teacher = Teacher.objects.first()
+        department = Department.objects.get()
+        for i in range(len(SLOTS) + 10):
+            Lesson.objects.create(
+                subgroup=union, semester=2, teacher=teacher,
+                subject=Subject.objects.create(name='Extra %s' % i, department=department))
+        recordings, unplaced = generate_timetable(
+            Lesson.objects.filter(semester=2), iterations=200, seed=1)
+        self.assertGreaterEqual(unplaced, 10)
+        self.assertEqual(len(recordings) + unplaced, len(SLOTS) + 10)
+        self.assertEqual(find_double_bookings(TimeTableRecording.objects.all()), [])
+
+
+class SaveTasksTest(TestCase):
+    def test_replace_refreshes_old_teachers(self):
+        create_university(faculties=1, specialties=1, years=(2020,), groups=1)
+        recording = TimeTableRecording.objects.first()
+        teacher = Teacher.objects.exclude(pk=recording.lesson.teacher_id).first()
+        recording.teacher = teacher
+        recording.save()
+        with mock.patch('timetableapp.solver.refresh_timetables') as refresh:
+            save_tasks([], [recording.lesson_id], replace=True)
+        self.assertIn((TEACHER, teacher.pk, None), refresh.call_args[0][0])
+        self.assertFalse(TimeTableRecording.objects.filter(pk=recording.pk).exists())
+
+
+class ReadOnlyOnExistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_university(faculties=1, specialties=1, years=(2019,), groups=2)
+        cls.group = Group.objects.get(number=1)
+
+    def test_changed(self):
+        group = Group.objects.get(pk=self.group.pk)
+        group.clean()
+        group.number = 7
+        with self.assertRaises(ValidationError):
+            group.clean()
+
+    def test_deferred_assigned(self):
+        group = Group.objects.only('pk').get(pk=self.group.pk)
+        group.number = 7
+        with self.assertNumQueries(2):
+            self.assertEqual(group.get_original_value('number'), 1)
+            self.assertEqual(group.group_stream_id, self.group.group_stream_id)
+            with self.assertRaises(ValidationError):
+                group.clean()
+        group.number = 1
+        group.clean()
+
+    def test_deferred_loaded(self):
+        stream = GroupStream.objects.defer('year').get(pk=self.group.group_stream_id)
+        self.assertEqual(stream.year, 2019)
+        stream.year = 2020
+        with self.assertNumQueries(0):
+            self.assertEqual(stream.get_original_value('year'), 2019)
+        with self.assertRaises(ValidationError):
+            stream.clean()
+
+    def test_refresh_from_db(self):
+        group = Group.objects.get(pk=self.group.pk)
+        Group.objects.filter(pk=group.pk).update(number=8)
+        group.refresh_from_db()
+        self.assertEqual(group.get_original_value('number'), 8)
+        group.number = 1
+        with self.assertRaises(ValidationError):
+            group.clean()
+
+    def formset(self, parent, model, fk, fields, changes):
+        """
+        Bind an inline formset of all ``model`` rows of ``parent``,
+        ``changes`` maps primary keys to changed field values.
+        """
+        instances = list(model.objects.filter(**{fk: parent}).order_by('pk'))
+        prefix = '%s_set' % model._meta.model_name
+        data = {
+            prefix + '-TOTAL_FORMS': len(instances),
+            prefix + '-INITIAL_FORMS': len(instances),
+        }
+        for k, instance in enumerate(instances):
+            data['%s-%s-id' % (prefix, k)] = instance.pk
+            for field in fields:
+                value = changes.get(instance.pk, {}).get(field, getattr(instance, field))
+                data['%s-%s-%s' % (prefix, k, field)] = value
+        return inlineformset_factory(
+            type(parent), model, fields=fields, extra=0,
+            formset=ReadOnlyOnExistInlineFormSet,
+        )(data, instance=parent)
+
+    def assertReadOnlyErrors(self, formset, expected):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(formset.is_valid(), not expected)
+        exists = [i for i in queries.captured_queries if 'EXISTS' in i['sql']]
+        self.assertEqual(len(exists), 1)
+        errors = [bool(i.non_field_errors()) for i in formset.forms]
+        self.assertEqual(
+            [i.instance.pk for i, error in zip(formset.forms, errors) if error],
+            expected)
+
+    def test_formset_groups(self):
+        stream = self.group.group_stream
+        # A group without dependents.
+        free = Group.objects.create(group_stream=stream, number=3)
+        free.subgroup_set.all().delete()
+        other = Group.objects.get(group_stream=stream, number=2)
+        formset = self.formset(stream, Group, 'group_stream', ['number'], {
+            self.group.pk: {'number': 5},
+            free.pk: {'number': 6},
+            other.pk: {'number': 7},
+        })
+        self.assertReadOnlyErrors(formset, [self.group.pk, other.pk])
+
+        formset = self.formset(stream, Group, 'group_stream', ['number'], {
+            free.pk: {'number': 6},
+        })
+        self.assertReadOnlyErrors(formset, [])
+        formset.save()
+        self.assertEqual(Group.objects.get(pk=free.pk).number, 6)
+
+    def test_formset_subgroups(self):
+        union, first, second = SubGroup.objects.filter(
+            group=self.group).order_by('numerator')
+        self.assertFalse(union.lesson_set.exists())
+        self.assertTrue(first.lesson_set.exists())
+        fields = ['numerator', 'denominator']
+        formset = self.formset(self.group, SubGroup, 'group', fields, {
+            union.pk: {'numerator': 1, 'denominator': 3},
+            second.pk: {'numerator': 3, 'denominator': 3},
+        })
+        self.assertReadOnlyErrors(formset, [second.pk])
+
+    def test_readonly_errors(self):
+        groups = list(Group.objects.filter(
+            group_stream=self.group.group_stream).order_by('number'))
+        subgroups = list(SubGroup.objects.filter(
+            group=self.group).order_by('numerator'))
+        groups[1].number = 9
+        subgroups[0].denominator = 5
+        subgroups[2].numerator = 5
+        instances = groups + subgroups
+        with self.assertNumQueries(2):
+            errors = readonly_errors(instances)
+        self.assertEqual(sorted(errors), [
+            instances.index(groups[1]), instances.index(subgroups[2])])
+        for error in errors.values():
+            self.assertIsInstance(error, ValidationError)
+
+class GroupStreamBulkCreateTest(TestCase):
+    def snapshot(self, specialty):
+        """Rows created for group streams of a specialty, without keys."""
+        def name(subgroup):
+            group = subgroup.group
+            return (group.group_stream.year, group.number, subgroup.numerator)
+
+        streams = GroupStream.objects.filter(specialty=specialty)
+        subgroups = SubGroup.objects.filter(
+            group__group_stream__specialty=specialty).select_related('group__group_stream')
+        conflicts = SubGroupConflict.objects.filter(
+            subgroup__group__group_stream__specialty=specialty,
+        ).select_related('subgroup__group__group_stream', 'other__group__group_stream')
+        return {
+            'curricula': sorted(Curriculum.objects.filter(
+                group_stream__in=streams).values_list(
+                'group_stream__year', 'semester', 'start_date', 'end_date')),
+            'groups': sorted(Group.objects.filter(
+                group_stream__in=streams).values_list('group_stream__year', 'number')),
+            'subgroups': sorted(
+                name(i) + (i.denominator,) for i in subgroups),
+            'conflicts': sorted(
+                (name(i.subgroup), name(i.other)) for i in conflicts),
+        }
+
+    def test_same_as_save(self):
+        # More semesters than default date ranges, the second one wraps
+        # over a new year.
+        form = FormOfStudy.objects.create(name='part-time', suffix='z', semesters=5)
+        FormOfStudySemester.objects.create(form=form, date_range=YearlessDateRange(
+            YearlessDate(9, 1), YearlessDate(12, 20)))
+        FormOfStudySemester.objects.create(form=form, date_range=YearlessDateRange(
+            YearlessDate(12, 21), YearlessDate(6, 30)))
+        faculty = Faculty.objects.create(name='Faculty', abbreviation='F')
+        saved, bulk = [
+            Specialty.objects.create(
+                faculty=faculty, name='Specialty %s' % i, number=i,
+                abbreviation='S%s' % i)
+            for i in range(2)
+        ]
+        years = (2019, 2020)
+        for year in years:
+            GroupStream.objects.create(specialty=saved, year=year, form=form)
+        streams = GroupStream.bulk_create(
+            GroupStream(specialty=bulk, year=year, form=form) for year in years)
+        self.assertTrue(all(i.pk for i in streams))
+
+        expected = self.snapshot(saved)
+        self.assertEqual(len(expected['curricula']), 2 * form.semesters)
+        self.assertEqual(expected['curricula'][:5], [
+            (2019, 1, date(2019, 9, 1), date(2019, 12, 20)),
+            (2019, 2, date(2019, 12, 21), date(2020, 6, 30)),
+            (2019, 3, date(2020, 9, 1), date(2020, 12, 20)),
+            (2019, 4, date(2020, 12, 21), date(2021, 6, 30)),
+            (2019, 5, date(2021, 9, 1), date(2021, 12, 20)),
+        ])
+        self.assertTrue(expected['conflicts'])
+        self.assertEqual(self.snapshot(bulk), expected)
+
+
+class GenerateUniversityTest(TestCase):
+    def test_tiny(self):
+        result = generate_university(SIZES['tiny'], seed=1, year=2020)
+        self.assertEqual(result.recordings, TimeTableRecording.objects.count())
+        self.assertEqual(result.lessons, Lesson.objects.count())
+        for stream in GroupStream.objects.all():
+            self.assertTrue(stream.group_set.filter(number=0).exists())
+            self.assertEqual(stream.curriculum_set.count(), stream.form.semesters)
+        for group in Group.objects.all():
+            self.assertTrue(group.subgroup_set.filter(numerator=0, denominator=0).exists())
+        conflicts = set(SubGroupConflict.objects.values_list('subgroup', 'other'))
+        SubGroupConflict.refresh(GroupStream.objects.values_list('pk', flat=True))
+        self.assertEqual(
+            conflicts, set(SubGroupConflict.objects.values_list('subgroup', 'other')))
+        recordings = list(TimeTableRecording.objects.all())
+        self.assertEqual(find_recording_conflicts(recordings), [])
+        self.assertEqual(find_double_bookings(recordings), [])
+        for lesson in Lesson.objects.all():
+            lesson.validate_unique()
+
+
+class RolloverTest(TestCase):
+    def test_no_double_bookings(self):
+        generate_university(SIZES['tiny'], seed=1, year=2020)
+        result = rollover(2020, 2021, 1)
+        self.assertGreater(result.recordings, 0)
+        self.assertGreater(result.classrooms_dropped + result.recordings_skipped, 0)
+        # 2021 semester 1 overlaps semester 3 of the 2020 group streams.
+        recordings = TimeTableRecording.objects.all()
+        self.assertEqual(find_double_bookings(recordings), [])
+
+
+class CompareBenchmarksTest(TestCase):
+    def test_compare(self):
+        base = {'sizes': {'tiny': {'a': {'best': 1.0}, 'b': {'best': 2.0}}}}
+        new = {'sizes': {
+            'tiny': {'a': {'best': 1.5}, 'c': {'best': 1.0}},
+            'small': {'a': {'best': 1.0}},
+        }}
+        result = compare(base, new)
+        self.assertEqual([(i.size, i.name, i.ratio) for i in result], [('tiny', 'a', 1.5)])
@@ -4,4 +4,8 @@ from . import views
 
 urlpatterns = [
     path('timetable/<int:group_stream>/<int:semester>', views.current_datetime),
+    path('timetable/teacher/<int:teacher>', views.teacher_timetable),
+    path('timetable/classrooms', views.classroom_occupancy),
+    path('timetable/classrooms/free', views.classroom_free),
+    path('timetable/faculty/<int:faculty>/<int:semester>', views.faculty_timetables),
 ]
@@ -1,161 +1,307 @@
-import math
 from collections import defaultdict
 
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.db.models import Q
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.translation import get_language
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from lesson_field import settings as lesson_settings
-from lesson_field.settings import DAY_NAMES, MAX_LESSONS_DAY, SHORT_WEEK_NAMES
+from lesson_field.helpers import WEEK_SLOTS
+from lesson_field.settings import (
+    LESSONS_RANGE, MAX_LESSONS_DAY, SHORT_DAY_NAMES, SHORT_WEEK_NAMES,
+    WORK_DAYS,
+)
 
-from .models import TimeTableRecording, Lesson
+from timetableapp import cache
+from timetableapp.conflicts import on_date
+from timetableapp.layout import Placement, layout, layout_many
+from timetableapp.occupancy import free_classrooms, get_occupancy
 
+from .models import TimeTableRecording, TimeTableStamp, Lesson
 
-DAY_ROWS = 2 * lesson_settings.MAX_LESSONS_DAY
-WEEK_ROWS = DAY_ROWS * len(lesson_settings.WORK_DAYS)
 
+LESSON_NAMES = dict(Lesson.LESSON_CHOICES)
+RECORDING_RELATED = (
+    'lesson',
+    'lesson__subject',
+    'lesson__subject__department',
+    'lesson__subgroup',
+    'lesson__subgroup__group',
+    'lesson__subgroup__group__group_stream',
+    'lesson__subgroup__group__group_stream__specialty',
+    'lesson__subgroup__group__group_stream__form',
+    'teacher',
+    'teacher__person',
+    'teacher__department',
+    'classroom',
+    'classroom__building',
+)
 
-def get_row(week, day, lesson):
-    return DAY_ROWS * day + 2 * (lesson - 1) + week + 2
 
+def recording_text(recording):
+    teacher_name = "-"
+    if recording.teacher:
+        teacher_name = recording.teacher.person.last_name
+    return "%s (%s) %s %s" % (
+        recording.lesson.subject, LESSON_NAMES[recording.lesson.lesson],
+        teacher_name, recording.classroom,
+    )
 
-def gen_cell(data, rowspan=1, colspan=1, width="100px"):
-    return (rowspan, colspan, data, width)
 
+def group_stream_placements(recordings):
+    """Convert recordings of one group stream into layout arguments."""
+    groups = {}
+    for i in recordings:
+        subgroup = i.lesson.subgroup
+        if not subgroup.group.is_union():
+            parts = groups.setdefault(subgroup.group, {1})
+            if not subgroup.is_union():
+                parts.add(subgroup.denominator)
+    order = sorted(groups, key=lambda i: i.number)
+    group_pos = {v: k for k, v in enumerate(order)}
+    columns = [(str(i), max(groups[i])) for i in order]
+    placements = []
+    for i in recordings:
+        subgroup = i.lesson.subgroup
+        lesson = i.lesson_number
+        placements.append(Placement(
+            group_pos.get(subgroup.group), subgroup.numerator,
+            subgroup.denominator, lesson.week, lesson.day, lesson.lesson,
+            recording_text(i),
+        ))
+    return columns, placements
 
-def lcm(a, b):
-    return (a * b) // math.gcd(a, b)
 
+def build_timetable(group_stream, semester):
+    ttrs = TimeTableRecording.objects.filter(
+        lesson__subgroup__group__group_stream=group_stream,
+        lesson__semester=semester,
+    ).select_related(*RECORDING_RELATED).order_by()
+    return layout(*group_stream_placements(list(ttrs)))
 
-def default_group_data():
-    return ({1}, 1)
 
+def group_recordings(semester, faculty=None, year=None, form=None):
+    """
+    Load recordings of every matching group stream with a single query and
+    return ``(group_stream, recordings)`` pairs in group stream order.
+    """
+    prefix = 'lesson__subgroup__group__group_stream__'
+    filters = {'lesson__semester': semester}
+    if faculty is not None:
+        filters[prefix + 'specialty__faculty'] = faculty
+    if year is not None:
+        filters[prefix + 'year'] = year
+    if form is not None:
+        filters[prefix + 'form'] = form
+    ttrs = TimeTableRecording.objects.filter(**filters).select_related(
+        *RECORDING_RELATED).order_by()
+    streams = {}
+    recordings = defaultdict(list)
+    for i in ttrs:
+        group_stream = i.lesson.subgroup.group.group_stream
+        streams[group_stream.pk] = group_stream
+        recordings[group_stream.pk].append(i)
+    order = sorted(streams.values(), key=lambda i: (-i.year, str(i)))
+    return [(i, recordings[i.pk]) for i in order]
 
-def accum_groups(elem, acc):
-    elem[1]["position"] += acc[1]['max_width']
-    return elem
 
+def iter_timetables(semester, faculty=None, year=None, form=None):
+    """
+    Yield ``(group_stream, data)`` of matching group streams, laying out
+    each one on demand.
+    """
+    return layout_many(
+        (group_stream, group_stream_placements(recordings))
+        for group_stream, recordings in group_recordings(
+            semester, faculty, year, form)
+    )
 
-def current_datetime(request, group_stream, semester):
-    ttrs = list(TimeTableRecording.objects.filter(
-        lesson__subgroup__group__group_stream=group_stream,
-        lesson__semester=semester,
-    ).select_related(
-        'lesson',
-        'lesson__subject',
-        'lesson__subject__department',
-        'lesson__subgroup',
-        'lesson__subgroup__group',
-        'lesson__subgroup__group__group_stream',
-        'lesson__subgroup__group__group_stream__specialty',
-        'lesson__subgroup__group__group_stream__form',
-        'teacher',
-        'teacher__person',
-        'teacher__department',
-        'classroom',
-        'classroom__building',
-    ).order_by(
-        'lesson__subgroup__numerator',
-        'lesson__subgroup__denominator',
-        'lesson__subgroup__group__number',
-    ).all())
-
-    group_stream = ttrs[0].lesson.subgroup.group.group_stream
-    subgroups = {i.lesson.subgroup for i in ttrs}
-    groups = defaultdict(set)
-    max_colspan = 1
-    for i in subgroups:
-        group = i.group
-        denominator = i.denominator
-        if not group.is_union() and not i.is_union():
-            groups[group].add(denominator)
-            max_colspan = lcm(max_colspan, denominator)
-
-    data = tuple([] for i in range(WEEK_ROWS + 2))
-    posl = list(0 for i in range(WEEK_ROWS + 2))
-    group_pos = {v: k for k, v in enumerate(groups.keys())}
-    max_max_colspan = len(group_pos) * max_colspan
-    LESSON_NAMES = dict(Lesson.LESSON_CHOICES)
-
-    for i in range(2):
-        for j in range(3):
-            data[i].append(gen_cell(""))
-        posl[i] = max_max_colspan
-
-    for group, i in groups.items():
-        data[0].append(gen_cell(str(group), 1, max_colspan))
-        subgroup = max(i)
-        sub_colspan = max_colspan // subgroup
-        for j in range(1, subgroup + 1):
-            data[1].append(gen_cell(j, 1, sub_colspan))
-
-    for day in lesson_settings.WORK_DAYS:
-        data[get_row(0, day, 1)].append(gen_cell(DAY_NAMES[day], DAY_ROWS))
-        for lesson in range(1, MAX_LESSONS_DAY + 1):
-            data[get_row(0, day, lesson)].append(gen_cell(lesson, 2))
-            for week in range(2):
-                data[get_row(week, day, lesson)].append(
-                    gen_cell(SHORT_WEEK_NAMES[week + 1]))
 
-    for i in ttrs:
+def stream_timetables(timetables):
+    """Render ``(group_stream, data)`` pairs into HTML row by row."""
+    head = get_template('timetableapp/timetables_head.html')
+    table = get_template('timetableapp/timetables_table.html')
+    row = get_template('timetableapp/row.html')
+    foot = get_template('timetableapp/timetables_foot.html')
+    yield head.render()
+    for group_stream, data in timetables:
+        yield table.render({'group_stream': group_stream})
+        for i in data:
+            yield row.render({'row': i})
+        yield '    </table>\n'
+    yield foot.render()
+
+
+def teacher_placements(recordings):
+    """
+    Convert recordings of one teacher into layout arguments. Lessons of one
+    day and lesson number share a cell, which takes both weeks when any of
+    them does.
+    """
+    texts = defaultdict(lambda: defaultdict(list))
+    for i in recordings:
         lesson = i.lesson_number
-        numerator = i.lesson.subgroup.numerator
-        denominator = i.lesson.subgroup.denominator
-        group = i.lesson.subgroup.group
-        if group.is_union():
-            colspan = max_max_colspan
-        else:
-            colspan = max_colspan // denominator if denominator else max_colspan
-        week = lesson.week
-        row = get_row(week - 1, lesson.day, lesson.lesson)
-        if week == 0b11:
-            row -= 2
-        out_pos = group_pos[group] * max_colspan if group in group_pos else 0
-        inner_pos = max_colspan // denominator * numerator if denominator else 0
-        pos = out_pos + inner_pos - 1
-        if week == 0b11:
-            diff = pos - posl[row]
-            if diff > 0:
-                if posl[row] == posl[row + 1]:
-                    data[row].append(gen_cell("", 2, diff))
-                    posl[row] += diff
-                    posl[row + 1] += diff
-                else:
-                    data[row].append(gen_cell("", 1, diff))
-                    posl[row] += diff
-                    diff2 = pos - posl[row + 1]
-                    data[row + 1].append(gen_cell("", 1, diff2))
-                    posl[row + 1] += diff2
+        texts[lesson.day, lesson.lesson][lesson.week].append(
+            "%s (%s) %s %s" % (
+                i.lesson.subject, LESSON_NAMES[i.lesson.lesson],
+                i.lesson.subgroup, i.classroom,
+            ))
+    placements = []
+    for (day, lesson), weeks in texts.items():
+        if set(weeks) <= {1, 2}:
+            placements.extend(
+                Placement(None, 0, 0, week, day, lesson, "; ".join(v))
+                for week, v in weeks.items())
         else:
-            diff = pos - posl[row]
-            if diff > 0:
-                data[row].append(gen_cell("", 1, diff))
-                posl[row] += diff
-        lesson_name = LESSON_NAMES[i.lesson.lesson]
-        teacher_name = "-"
-        if i.teacher:
-            teacher_name = i.teacher.person.last_name
-        string = "%s (%s) %s %s" % (
-            i.lesson.subject, lesson_name, teacher_name,
-            i.classroom
-        )
-        if week == 0b11:
-            data[row].append(gen_cell(string, 2, colspan))
-            posl[row] += colspan
-            posl[row + 1] += colspan
-        else:
-            data[row].append(gen_cell(string, 1, colspan))
-            posl[row] += colspan
-
-    for row in range(len(posl)):
-        diff = max_max_colspan - posl[row]
-        if diff > 0:
-            rows = 1
-            if row % 2 == 0 and posl[row] == posl[row + 1]:
-                rows = 2
-            data[row].append(gen_cell("", rows, diff))
-            for i in range(rows):
-                posl[row + i] += diff
-
-    return HttpResponse(render_to_string('timetableapp/timetable.html', {
-        'data': data,
+            text = "; ".join(j for k in sorted(weeks) for j in weeks[k])
+            placements.append(Placement(None, 0, 0, 3, day, lesson, text))
+    return [], placements
+
+
+def build_teacher_timetable(teacher, day):
+    """
+    Lay out recordings of a teacher which take place at ``day``. Recordings
+    without their own teacher take the teacher of their lesson.
+    """
+    ttrs = on_date(TimeTableRecording.objects.filter(
+        Q(teacher=teacher) | Q(teacher__isnull=True, lesson__teacher=teacher),
+    ), day).select_related(*RECORDING_RELATED).order_by()
+    return layout(*teacher_placements(list(ttrs)))
+
+
+def get_grid(owner, pk, period, build, stamp=None):
+    data = cache.get_timetable('grid', pk, period, owner, stamp)
+    if data is None:
+        data = build(pk, period)
+        cache.set_timetable('grid', pk, period, data, owner, stamp)
+    return data
+
+
+def get_html(owner, pk, period, build, stamp=None):
+    content = cache.get_timetable('html', pk, period, owner, stamp)
+    if content is None:
+        content = render_to_string('timetableapp/timetable.html', {
+            'data': get_grid(owner, pk, period, build, stamp),
+        })
+        cache.set_timetable('html', pk, period, content, owner, stamp)
+    return content
+
+
+def get_stamp(request, group_stream, semester):
+    # ETag and Last-Modified callbacks share one lookup per request.
+    if not hasattr(request, '_timetable_stamp'):
+        request._timetable_stamp = TimeTableStamp.objects.filter(
+            group_stream=group_stream, semester=semester,
+        ).values_list('version', 'modified').first()
+    return request._timetable_stamp
+
+
+def timetable_etag(request, group_stream, semester):
+    stamp = get_stamp(request, group_stream, semester)
+    if stamp:
+        return '%s-%s-%s-%s' % (group_stream, semester, stamp[0], get_language())
+    return None
+
+
+def timetable_last_modified(request, group_stream, semester):
+    stamp = get_stamp(request, group_stream, semester)
+    if stamp:
+        return stamp[1]
+    return None
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=timetable_etag, last_modified_func=timetable_last_modified)
+def current_datetime(request, group_stream, semester):
+    # The body is cached under the stamp version its ETag is made of, so
+    # every process serves the same body for the same ETag.
+    stamp = get_stamp(request, group_stream, semester)
+    return HttpResponse(get_html(
+        cache.STREAM, group_stream, semester, build_timetable,
+        stamp[0] if stamp else 0,
+    ))
+
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def faculty_timetables(request, faculty, semester):
+    timetables = iter_timetables(
+        semester, faculty,
+        year=int_or_none(request.GET.get('year')),
+        form=int_or_none(request.GET.get('form')),
+    )
+    return StreamingHttpResponse(stream_timetables(timetables))
+
+
+def get_date(request):
+    """Return the ``date`` query parameter, today by default."""
+    value = request.GET.get('date')
+    if value is None:
+        return timezone.localdate()
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def teacher_timetable(request, teacher):
+    # Teacher timetables have no stamp, so with a per-process cache other
+    # processes may serve them stale for up to CACHE_TIMEOUT. Point
+    # TIMETABLEAPP_CACHE_ALIAS at a shared cache to avoid it.
+    day = get_date(request)
+    if day is None:
+        return HttpResponseBadRequest()
+    return HttpResponse(get_html(
+        cache.TEACHER, teacher, day, build_teacher_timetable,
+    ))
+
+
+def occupancy_row(mask):
+    row = []
+    for day in WORK_DAYS:
+        for lesson in LESSONS_RANGE:
+            bit = day * MAX_LESSONS_DAY + lesson - 1
+            week = (mask >> bit) & 1 | ((mask >> (bit + WEEK_SLOTS)) & 1) << 1
+            row.append(SHORT_WEEK_NAMES[week] if week else "")
+    return row
+
+
+def classroom_occupancy(request):
+    day = get_date(request)
+    if day is None:
+        return HttpResponseBadRequest()
+    building = int_or_none(request.GET.get('building'))
+    rows = [
+        (i.name, occupancy_row(i.mask)) for i in get_occupancy(day)
+        if building is None or i.building == building
+    ]
+    return HttpResponse(render_to_string('timetableapp/occupancy.html', {
+        'days': [SHORT_DAY_NAMES[i] for i in WORK_DAYS],
+        'lessons': LESSONS_RANGE,
+        'rows': rows,
     }))
+
+
+def classroom_free(request):
+    day = get_date(request)
+    week, weekday, lesson = [
+        int_or_none(request.GET.get(i)) for i in ('week', 'day', 'lesson')]
+    if (day is None or week not in (1, 2, 3) or weekday not in WORK_DAYS
+            or lesson not in LESSONS_RANGE):
+        return HttpResponseBadRequest()
+    building = int_or_none(request.GET.get('building'))
+    classrooms = free_classrooms(day, week, weekday, lesson, building=building)
+    return JsonResponse({'classrooms': [
+        {'id': i.classroom, 'building': i.building, 'name': i.name}
+        for i in classrooms
+    ]})
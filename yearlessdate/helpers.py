@@ -1,30 +1,70 @@
 import calendar
-from django.utils.deconstruct import deconstructible
 from django.utils.translation import ugettext_lazy as _
 
 from .settings import *
 
-@deconstructible
+# Days of every month of TEST_YEAR, the first item is a placeholder.
+MONTH_DAYS = (0,) + tuple(
+    calendar.monthrange(TEST_YEAR, month)[1] for month in range(1, 13)
+)
+
+
 class YearlessDate(object):
-    def __init__(self, month, day, *args, **kwargs):
-        super(YearlessDate, self).__init__(*args, **kwargs)
-        self.month = int(month)
-        self.day = int(day)
-        self._validate()
+    """
+    Immutable day of a month. Instances are interned by packed value
+    ``month * 32 + day``, so equal dates share one object.
+    """
+    __slots__ = ('month', 'day', 'value')
+    _instances = {}
+
+    def __new__(cls, month, day):
+        month, day = int(month), int(day)
+        value = month * 32 + day
+        try:
+            return cls._instances[value]
+        except KeyError:
+            pass
+        cls._validate(month, day)
+        self = super(YearlessDate, cls).__new__(cls)
+        object.__setattr__(self, 'month', month)
+        object.__setattr__(self, 'day', day)
+        object.__setattr__(self, 'value', value)
+        return cls._instances.setdefault(value, self)
+
+    @classmethod
+    def from_value(cls, value):
+        try:
+            return cls._instances[value]
+        except KeyError:
+            return cls(value // 32, value % 32)
 
     def create_range(self, end_date):
         return YearlessDateRange(self, end_date)
 
-    def _validate(self):
-        try:
-            week, month_days = calendar.monthrange(TEST_YEAR, self.month)
-        except calendar.IllegalMonthError:
+    @staticmethod
+    def _validate(month, day):
+        if month < 1 or month > 12:
             error = _("Cannot create YearlessDate object with a month value of {}.")
-            raise ValueError(error.format(self.month))
+            raise ValueError(error.format(month))
 
-        if self.day < 1 or self.day > month_days:
+        if day < 1 or day > MONTH_DAYS[month]:
             error = _("Cannot create YearlessDate object - invalid day value {} for month {}.")
-            raise ValueError(error.format(self.day, self.month_name))
+            raise ValueError(error.format(day, _(calendar.month_name[month])))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("YearlessDate is immutable.")
+
+    def __reduce__(self):
+        return (YearlessDate, (self.month, self.day))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def deconstruct(self):
+        return ('yearlessdate.helpers.YearlessDate', (self.month, self.day), {})
 
     @property
     def month_name(self):
@@ -33,40 +73,91 @@ class YearlessDate(object):
     def __str__(self):
         return '{} {}'.format(self.day, self.month_name)
 
-    def __eq__(self, other):
-        return (self.day == other.day) and (self.month == other.month)
+    def __hash__(self):
+        return self.value
 
-    def __gt__(self, other):
-        if self.month != other.month:
-            return self.month > other.month
-        return self.day > other.day
+    def __eq__(self, other):
+        if not isinstance(other, YearlessDate):
+            return NotImplemented
+        return self.value == other.value
 
     def __ne__(self, other):
-        return not self == other
+        if not isinstance(other, YearlessDate):
+            return NotImplemented
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return self.value < other.value
 
     def __le__(self, other):
-        return not self > other
+        return self.value <= other.value
+
+    def __gt__(self, other):
+        return self.value > other.value
 
     def __ge__(self, other):
-        return (self > other) or self == other
+        return self.value >= other.value
 
-    def __lt__(self, other):
-        return not self >= other
 
-@deconstructible
 class YearlessDateRange(object):
-    def __init__(self, start, end, *args, **kwargs):
-        super(YearlessDateRange, self).__init__(*args, **kwargs)
-        self.start = start
-        self.end = end
-        self._validate()
-
-    def _validate(self):
-        sdi = isinstance(self.start, YearlessDate)
-        edi = isinstance(self.end, YearlessDate)
-        if not sdi or not edi:
-            error = _("Start date and end date must be YearlessDate type.")
-            raise ValueError(error.format(self.month))
+    """
+    Immutable range of yearless dates, interned by packed value
+    ``start * 512 + end``.
+    """
+    __slots__ = ('start', 'end', 'value')
+    _instances = {}
+
+    def __new__(cls, start, end):
+        if not isinstance(start, YearlessDate) or not isinstance(end, YearlessDate):
+            raise ValueError(_("Start date and end date must be YearlessDate type."))
+        value = start.value * 512 + end.value
+        try:
+            return cls._instances[value]
+        except KeyError:
+            pass
+        self = super(YearlessDateRange, cls).__new__(cls)
+        object.__setattr__(self, 'start', start)
+        object.__setattr__(self, 'end', end)
+        object.__setattr__(self, 'value', value)
+        return cls._instances.setdefault(value, self)
+
+    @classmethod
+    def from_value(cls, value):
+        try:
+            return cls._instances[value]
+        except KeyError:
+            return cls(
+                YearlessDate.from_value(value // 512),
+                YearlessDate.from_value(value % 512),
+            )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("YearlessDateRange is immutable.")
+
+    def __reduce__(self):
+        return (YearlessDateRange, (self.start, self.end))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def deconstruct(self):
+        return ('yearlessdate.helpers.YearlessDateRange', (self.start, self.end), {})
+
+    def __hash__(self):
+        return self.value
+
+    def __eq__(self, other):
+        if not isinstance(other, YearlessDateRange):
+            return NotImplemented
+        return self.value == other.value
+
+    def __ne__(self, other):
+        if not isinstance(other, YearlessDateRange):
+            return NotImplemented
+        return self.value != other.value
 
     def are_overlap(self, other):
         array = list(enumerate([
@@ -8,7 +8,7 @@ class YearlessDateField(models.Field):
             return value
         if not value:
             return None
-        return YearlessDate(int(value / 32), value % 32)
+        return YearlessDate.from_value(value)
 
     def from_db_value(self, value, expression, connection):
         return self.to_python(value)
@@ -18,7 +18,7 @@ class YearlessDateField(models.Field):
 
     def get_prep_value(self, value):
         if value is not None:
-            return value.month * 32 + value.day
+            return value.value
 
     def value_to_string(self, obj):
         value = self.value_from_object(obj)
@@ -35,11 +35,7 @@ class YearlessDateRangeField(models.Field):
             return value
         if not value:
             return None
-        start = int(value / 512)
-        end = int(value % 512)
-        start_date = YearlessDate(int(start / 32), start % 32)
-        end_date = YearlessDate(int(end / 32), end % 32)
-        return YearlessDateRange(start_date, end_date)
+        return YearlessDateRange.from_value(value)
 
     def from_db_value(self, value, expression, connection):
         return self.to_python(value)
@@ -50,9 +46,7 @@ class YearlessDateRangeField(models.Field):
     def get_prep_value(self, value):
         if value is not None:
             if isinstance(value, YearlessDateRange):
-                start = value.start.month * 32 + value.start.day
-                end = value.end.month * 32 + value.end.day
-                return start * 512 + end
+                return value.value
             elif isinstance(value, int): return value
 
     def value_to_string(self, obj):
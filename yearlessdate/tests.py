@@ -0,0 +1,98 @@
+import copy
+import pickle
+
+from django.db.migrations.writer import MigrationWriter
+from django.test import SimpleTestCase
+
+from yearlessdate.helpers import YearlessDate, YearlessDateRange
+
+
+def migration_round_trip(value):
+    """Serialize a value as a migration would and evaluate it back."""
+    string, imports = MigrationWriter.serialize(value)
+    scope = {}
+    for i in imports:
+        exec(i, scope)
+    return eval(string, scope)
+
+
+class YearlessDateTest(SimpleTestCase):
+    def test_interning(self):
+        date = YearlessDate(9, 1)
+        self.assertIs(YearlessDate('9', '1'), date)
+        self.assertIs(YearlessDate.from_value(date.value), date)
+        self.assertEqual(date.value, 9 * 32 + 1)
+        self.assertEqual(hash(date), date.value)
+
+    def test_from_value(self):
+        # A value not interned yet.
+        date = YearlessDate.from_value(11 * 32 + 17)
+        self.assertEqual((date.month, date.day), (11, 17))
+        self.assertIs(YearlessDate(11, 17), date)
+        with self.assertRaises(ValueError):
+            YearlessDate.from_value(2 * 32 + 30)
+
+    def test_immutable(self):
+        date = YearlessDate(9, 1)
+        with self.assertRaises(AttributeError):
+            date.day = 2
+        self.assertEqual(date.day, 1)
+
+    def test_pickle_and_copy(self):
+        date = YearlessDate(12, 31)
+        self.assertIs(pickle.loads(pickle.dumps(date)), date)
+        self.assertIs(copy.copy(date), date)
+        self.assertIs(copy.deepcopy([date])[0], date)
+
+    def test_deconstruct(self):
+        date = YearlessDate(2, 29)
+        self.assertIs(migration_round_trip(date), date)
+
+    def test_invalid(self):
+        for month, day in ((0, 1), (13, 1), (2, 30), (4, 31), (1, 0)):
+            with self.subTest(month=month, day=day):
+                with self.assertRaises(ValueError):
+                    YearlessDate(month, day)
+
+    def test_compare(self):
+        self.assertLess(YearlessDate(1, 31), YearlessDate(2, 1))
+        self.assertGreaterEqual(YearlessDate(2, 1), YearlessDate(2, 1))
+        self.assertNotEqual(YearlessDate(2, 1), YearlessDate(2, 2))
+        self.assertFalse(YearlessDate(2, 1) == (2, 1))
+        self.assertTrue(YearlessDate(2, 1) != 65)
+
+
+class YearlessDateRangeTest(SimpleTestCase):
+    def setUp(self):
+        self.range = YearlessDateRange(YearlessDate(9, 1), YearlessDate(12, 31))
+
+    def test_interning(self):
+        self.assertIs(
+            YearlessDate(9, 1).create_range(YearlessDate(12, 31)), self.range)
+        self.assertIs(YearlessDateRange.from_value(self.range.value), self.range)
+        value = YearlessDate(3, 3).value * 512 + YearlessDate(4, 4).value
+        date_range = YearlessDateRange.from_value(value)
+        self.assertEqual(
+            (date_range.start, date_range.end),
+            (YearlessDate(3, 3), YearlessDate(4, 4)))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            YearlessDateRange(YearlessDate(9, 1), (12, 31))
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.range.end = YearlessDate(12, 30)
+
+    def test_pickle_and_copy(self):
+        self.assertIs(pickle.loads(pickle.dumps(self.range)), self.range)
+        self.assertIs(copy.copy(self.range), self.range)
+        self.assertIs(copy.deepcopy(self.range), self.range)
+
+    def test_deconstruct(self):
+        self.assertIs(migration_round_trip(self.range), self.range)
+
+    def test_compare(self):
+        self.assertEqual(self.range, YearlessDateRange.from_value(self.range.value))
+        self.assertFalse(self.range == self.range.value)
+        self.assertTrue(self.range != None)